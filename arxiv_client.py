@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import arxiv
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import metrics
+
+
+# arXiv's Terms of Use ask for no more than one request every three seconds
+DELAY_SECONDS = float(os.getenv("ARXIV_DELAY_SECONDS", "3.0"))
+NUM_RETRIES = int(os.getenv("ARXIV_NUM_RETRIES", "3"))
+BACKOFF_SECONDS = float(os.getenv("ARXIV_BACKOFF_SECONDS", "1.0"))
+POOL_SIZE = int(os.getenv("ARXIV_POOL_SIZE", "10"))
+# Point this at a local stand-in, e.g. http://127.0.0.1:8080/api/query
+API_URL = os.getenv("ARXIV_API_URL")
+
+
+class RateLimiter:
+    """
+    Spaces calls to `wait` at least `min_interval` seconds apart across threads.
+
+    Each caller reserves the next free slot under the lock and sleeps outside
+    it, so concurrent callers queue up instead of all waking at once.
+    """
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_slot = 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class SharedClient(arxiv.Client):
+    """
+    An `arxiv.Client` meant to be shared by every tool call in the process.
+
+    It keeps one pooled HTTP session, takes every page request through a
+    shared `RateLimiter` instead of the per-client delay, and retries failed
+    requests with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        page_size: int = 100,
+        delay_seconds: float = DELAY_SECONDS,
+        num_retries: int = NUM_RETRIES,
+        backoff_seconds: float = BACKOFF_SECONDS,
+        pool_size: int = POOL_SIZE,
+        api_url: Optional[str] = API_URL,
+    ):
+        # Spacing and retries are handled here, not by the base class
+        super().__init__(page_size=page_size, delay_seconds=0, num_retries=0)
+        self.limiter = RateLimiter(delay_seconds)
+        self.retries = num_retries
+        self.backoff_seconds = backoff_seconds
+
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        if api_url:
+            self.query_url_format = api_url + "?{}"
+
+    def _parse_feed(self, url: str, first_page: bool = True, _try_index: int = 0):
+        for attempt in range(self.retries + 1):
+            self.limiter.wait()
+            try:
+                return super()._parse_feed(url, first_page=first_page)
+            except (
+                arxiv.HTTPError,
+                arxiv.UnexpectedEmptyPageError,
+                requests.exceptions.ConnectionError,
+            ):
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff_seconds * 2 ** attempt)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> SharedClient:
+    """Return the process-wide arXiv client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SharedClient()
+    return _client
+
+
+def fetch_papers(topic: str, max_results: int = 5) -> Dict[str, Dict]:
+    """
+    Search arXiv for the most relevant papers on a topic.
+
+    Args:
+        topic: The topic to search for
+        max_results: Maximum number of results to retrieve
+
+    Returns:
+        Paper information keyed by paper ID, in relevance order
+    """
+    search = arxiv.Search(
+        query=topic,
+        max_results=max_results,
+        sort_by=arxiv.SortCriterion.Relevance
+    )
+
+    papers_info = {}
+    with metrics.track("stage", "arxiv_fetch"):
+        for paper in get_client().results(search):
+            papers_info[paper.get_short_id()] = {
+                'title': paper.title,
+                'authors': [author.name for author in paper.authors],
+                'summary': paper.summary,
+                'pdf_url': paper.pdf_url,
+                'published': str(paper.published.date())
+            }
+    return papers_info
@@ -1,65 +1,32 @@
 import json
-import os
 from typing import List
 
-import arxiv
+from arxiv_client import fetch_papers
+from paper_storage import get_storage
+from search_cache import get_search_cache
+from write_queue import get_write_queue
 
 
 PAPER_DIR = "papers"
 
 
 def search_paper(topic: str, max_results: int = 5) -> List[str]:
-    client = arxiv.Client()
-    search = arxiv.Search(
-        query=topic,
-        max_results=max_results,
-        sort_by=arxiv.SortCriterion.Relevance,
-    )
-
-    papers = client.results(search)
-    path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
-    os.makedirs(path, exist_ok=True)
-
-    file_path = os.path.join(path, "papers_info.json")
-    try:
-        with open(file_path, "r") as json_file:
-            papers_info = json.load(json_file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        papers_info = {}
-    
-    # process each paper and add it to papers_info.json
-    paper_ids = []
-    for paper in papers:
-        paper_ids.append(paper.get_short_id())
-        paper_info = {
-            "title": paper.title,
-            "authors": [author.name for author in paper.authors],
-            "summary": paper.summary, 
-            "pdf_url": paper.pdf_url, 
-            "published": str(paper.published.date())
-        }
-        papers_info[paper.get_short_id()] = paper_info
+    cache = get_search_cache()
+    papers_info = cache.get(topic, max_results)
+    if papers_info is None:
+        papers_info = fetch_papers(topic, max_results)
+        cache.put(topic, max_results, papers_info)
     
-    # save updated papers_info to json file
-    with open(file_path, "w") as json_file:
-        json.dump(papers_info, json_file, indent=2)
+    # save papers_info under the topic
+    topic_dir = topic.lower().replace(" ", "_")
+    location = get_write_queue(PAPER_DIR).add_papers(topic_dir, papers_info)
     
-    print(f"Results are saved in {file_path}")
-    return paper_ids
+    print(f"Results are saved in {location}")
+    return list(papers_info)
 
 
 def extract(paper_id: str) -> str:
-    for item in os.listdir(PAPER_DIR):
-        item_path = os.path.join(PAPER_DIR, item)
-        if os.path.isdir(item_path):
-            file_path = os.path.join(item_path, "papers_info.json")
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r") as json_file:
-                        papers_info = json.load(json_file)
-                        if paper_id in papers_info:
-                            return json.dumps(papers_info[paper_id], indent=2)
-                except (FileNotFoundError, json.JSONDecodeError) as e:
-                    print(f"Error reading {file_path}: {str(e)}")
-                    continue
+    paper_info = get_storage(PAPER_DIR).get_paper(paper_id)
+    if paper_info is not None:
+        return json.dumps(paper_info, indent=2)
     return f"There is no saved information related to the paper: {paper_id}"
@@ -0,0 +1,224 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from ingest import WORDS
+
+
+def synthetic_paper(rng: random.Random, paper_id: str) -> Dict:
+    """Build a paper record shaped like the ones `fetch_papers` returns."""
+    return {
+        "title": " ".join(rng.choices(WORDS, k=8)).title(),
+        "authors": [f"Author {rng.randrange(5000)}" for _ in range(rng.randint(1, 6))],
+        "summary": " ".join(rng.choices(WORDS, k=150)),
+        "pdf_url": f"http://arxiv.org/pdf/{paper_id}",
+        "published": f"20{rng.randint(15, 25)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+    }
+
+
+class FakeArxiv:
+    """In-process stand-in for `fetch_papers`: deterministic results, no network."""
+
+    def __init__(self, seed: int = 0):
+        self.seed = seed
+        self.calls = 0
+
+    def fetch_papers(self, topic: str, max_results: int = 5) -> Dict[str, Dict]:
+        self.calls += 1
+        rng = random.Random(f"{self.seed}:{topic}")
+        return {
+            paper_id: synthetic_paper(rng, paper_id)
+            for paper_id in (f"9{rng.randrange(10 ** 8):08d}v1" for _ in range(max_results))
+        }
+
+
+def build_tree(storage, topics: int, papers_per_topic: int, overlap: float, seed: int) -> List[str]:
+    """
+    Fill `storage` with synthetic topics and return the IDs of the stored papers.
+
+    A fraction `overlap` of each topic's papers is drawn from papers already
+    stored under other topics, as happens when searches overlap.
+    """
+    rng = random.Random(seed)
+    records = {}
+    paper_ids = []
+    for topic in range(topics):
+        papers = {}
+        for _ in range(papers_per_topic):
+            if paper_ids and rng.random() < overlap:
+                paper_id = rng.choice(paper_ids)
+            else:
+                paper_id = f"{2000 + topic:04d}.{len(paper_ids):05d}v1"
+                records[paper_id] = synthetic_paper(rng, paper_id)
+                paper_ids.append(paper_id)
+            papers[paper_id] = records[paper_id]
+        storage.add_papers(f"topic_{topic:04d}", papers)
+    return paper_ids
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def measure(operation: Callable[[int], object], iterations: int, memory_iterations: int) -> Dict:
+    """
+    Time `operation(i)` for i in range(iterations) and report its costs.
+
+    Latencies are taken without tracing; peak memory comes from a separate
+    run of `memory_iterations` calls under tracemalloc, which slows calls down.
+    """
+    samples = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        operation(i)
+        samples.append(time.perf_counter() - call_started)
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    for i in range(iterations, iterations + memory_iterations):
+        operation(i)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p90_ms": percentile(samples, 0.90) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+        "max_ms": max(samples) * 1000,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "ops_per_second": iterations / elapsed if elapsed else 0.0,
+        "peak_memory_kb": peak / 1024,
+    }
+
+
+def run(args: argparse.Namespace) -> Dict:
+    os.makedirs(args.workdir, exist_ok=True)
+    os.chdir(args.workdir)
+    os.environ["PAPER_STORAGE"] = args.storage
+    os.environ.setdefault("WRITE_FLUSH_INTERVAL", str(args.flush_interval))
+
+    # Imported after the environment is set, since modules read it on import
+    import stdio_server
+    from paper_storage import get_storage
+
+    fake = FakeArxiv(args.seed)
+    stdio_server.fetch_papers = fake.fetch_papers
+
+    storage = get_storage(stdio_server.PAPER_DIR)
+    started = time.perf_counter()
+    paper_ids = build_tree(storage, args.topics, args.papers_per_topic, args.overlap, args.seed)
+    build_seconds = time.perf_counter() - started
+
+    rng = random.Random(args.seed)
+    topic_names = [f"topic_{topic:04d}" for topic in range(args.topics)]
+    operations = {
+        "extract_info": lambda i: stdio_server.extract_info(rng.choice(paper_ids)),
+        "extract_info_batch": lambda i: stdio_server.extract_info_batch(rng.sample(paper_ids, 10)),
+        "get_topic_papers": lambda i: stdio_server.get_topic_papers(rng.choice(topic_names)),
+        "get_available_folders": lambda i: stdio_server.get_available_folders(),
+        "search_papers_cold": lambda i: stdio_server.search_papers(f"new topic {i}", 5),
+        "search_papers_cached": lambda i: stdio_server.search_papers("repeated topic", 5),
+        "search_local": lambda i: stdio_server.search_local(" ".join(rng.choices(WORDS, k=3))),
+    }
+    selected = args.ops or list(operations)
+    unknown = set(selected) - set(operations)
+    if unknown:
+        raise ValueError(f"Unknown operations: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in selected:
+        # Tools print progress; keep the report readable
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            results[name] = measure(operations[name], args.iterations, args.memory_iterations)
+
+    return {
+        "config": {
+            "storage": args.storage,
+            "topics": args.topics,
+            "papers_per_topic": args.papers_per_topic,
+            "overlap": args.overlap,
+            "stored_papers": len(paper_ids),
+            "iterations": args.iterations,
+            "python": sys.version.split()[0],
+        },
+        "build_seconds": build_seconds,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "fake_arxiv_calls": fake.calls,
+        "operations": results,
+    }
+
+
+def print_report(report: Dict, baseline: Optional[Dict] = None) -> None:
+    config = report["config"]
+    print(
+        f"{config['storage']} storage, {config['topics']} topics x {config['papers_per_topic']} papers "
+        f"({config['stored_papers']} unique), built in {report['build_seconds']:.2f}s, "
+        f"max RSS {report['max_rss_kb'] / 1024:.1f} MB"
+    )
+    header = f"{'operation':<24}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'ops/s':>12}{'peak KB':>12}"
+    if baseline:
+        header += f"{'p50 vs base':>14}"
+    print(header)
+    for name, stats in report["operations"].items():
+        line = (
+            f"{name:<24}{stats['p50_ms']:>10.3f}{stats['p90_ms']:>10.3f}{stats['p99_ms']:>10.3f}"
+            f"{stats['ops_per_second']:>12.1f}{stats['peak_memory_kb']:>12.1f}"
+        )
+        base = (baseline or {}).get("operations", {}).get(name)
+        if base and base["p50_ms"]:
+            line += f"{(stats['p50_ms'] / base['p50_ms'] - 1):>+14.1%}"
+        print(line)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Benchmark the research server's tools on a synthetic papers/ tree."
+    )
+    parser.add_argument("--storage", choices=["json", "sqlite", "binary"], default="json")
+    parser.add_argument("--topics", type=int, default=50)
+    parser.add_argument("--papers-per-topic", type=int, default=50)
+    parser.add_argument("--overlap", type=float, default=0.1,
+                        help="Fraction of a topic's papers also stored under earlier topics")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--memory-iterations", type=int, default=20)
+    parser.add_argument("--flush-interval", type=float, default=0.0,
+                        help="WRITE_FLUSH_INTERVAL for the write queue (unless already set)")
+    parser.add_argument("--ops", nargs="*", help="Operations to run (default: all)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", default=None,
+                        help="Directory for the synthetic tree (default: a fresh temporary one)")
+    parser.add_argument("--output", help="Write the report as JSON to this file")
+    parser.add_argument("--baseline", help="JSON report to compare median latencies against")
+    args = parser.parse_args()
+    temporary = args.workdir is None
+    args.workdir = args.workdir or tempfile.mkdtemp(prefix="research-bench-")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r") as baseline_file:
+            baseline = json.load(baseline_file)
+
+    output = os.path.abspath(args.output) if args.output else None
+    try:
+        report = run(args)
+    finally:
+        if temporary:
+            shutil.rmtree(args.workdir, ignore_errors=True)
+    print_report(report, baseline)
+    if output:
+        with open(output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
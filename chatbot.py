@@ -1,10 +1,11 @@
+import asyncio
 import json
 import os
 
 import anthropic
 from dotenv import load_dotenv
 
-from arxiv_funcs import search_papers, extract_info
+from arxiv_funcs import search_paper, extract
 
 
 PAPER_DIR = "papers"
@@ -49,8 +50,8 @@ tools = [
 
 # Tool mapping and execution
 mapping_tool_function = {
-    "search_papers": search_papers, 
-    "extract_info": extract_info,
+    "search_papers": search_paper, 
+    "extract_info": extract,
 }
 
 
@@ -70,66 +71,61 @@ def execute_tool(tool_name, tool_args):
     return result
 
 
-def process_query(client, query):
+async def process_query(client, query):
     
     messages = [{'role': 'user', 'content': query}]
     
-    response = client.messages.create(max_tokens = 2024,
-                                  model = 'claude-3-7-sonnet-20250219', 
-                                  tools = tools,
-                                  messages = messages)
-    
-    process_query = True
-    while process_query:
-        assistant_content = []
-
-        for content in response.content:
-            if content.type == 'text':
-                
-                print(content.text)
-                assistant_content.append(content)
+    while True:
+        tool_calls = []
+        
+        # Stream the response so text prints as it arrives, and start each
+        # tool in a worker thread as soon as its tool_use block is complete
+        async with client.messages.stream(max_tokens = 2024,
+                                          model = 'claude-3-7-sonnet-20250219', 
+                                          tools = tools,
+                                          messages = messages) as stream:
+            async for event in stream:
+                if event.type == 'text':
+                    print(event.text, end='', flush=True)
                 
-                if len(response.content) == 1:
-                    process_query = False
+                elif event.type == 'content_block_stop':
+                    content = event.content_block
+                    if content.type == 'text':
+                        print()
+                    
+                    elif content.type == 'tool_use':
+                        print(f"Calling tool {content.name} with args {content.input}")
+                        task = asyncio.create_task(
+                            asyncio.to_thread(execute_tool, content.name, content.input)
+                        )
+                        tool_calls.append((content.id, task))
             
-            elif content.type == 'tool_use':
-                
-                assistant_content.append(content)
-                messages.append({'role': 'assistant', 'content': assistant_content})
-                
-                tool_id = content.id
-                tool_args = content.input
-                tool_name = content.name
-                print(f"Calling tool {tool_name} with args {tool_args}")
-                
-                result = execute_tool(tool_name, tool_args)
-                messages.append({"role": "user", 
-                                  "content": [
-                                      {
-                                          "type": "tool_result",
-                                          "tool_use_id": tool_id,
-                                          "content": result
-                                      }
-                                  ]
-                                })
-                response = client.messages.create(max_tokens = 2024,
-                                  model = 'claude-3-7-sonnet-20250219', 
-                                  tools = tools,
-                                  messages = messages) 
-                
-                if len(response.content) == 1 and response.content[0].type == "text":
-                    print(response.content[0].text)
-                    process_query = False
-
-
-def chat_loop(client):
+            response = await stream.get_final_message()
+        
+        if not tool_calls:
+            break
+        
+        messages.append({'role': 'assistant', 'content': response.content})
+        messages.append({"role": "user", 
+                          "content": [
+                              {
+                                  "type": "tool_result",
+                                  "tool_use_id": tool_id,
+                                  "content": await task
+                              }
+                              for tool_id, task in tool_calls
+                          ]
+                        })
+
+
+async def chat_loop(client):
     print("Type your queries or type 'quit' to exit.")
     while True:
         try:
             query = input("\nQuery: ").strip()
             if query.lower() == 'quit':
                 break
-            process_query(client, query)
+            await process_query(client, query)
             print("\n")
         except Exception as e:
             print(f"\nError: {str(e)}")
@@ -138,5 +134,5 @@ def chat_loop(client):
 if __name__ == "__main__":
     load_dotenv(dotenv_path=".env")
     api_key = os.getenv("ANTHROPIC_API_KEY")
-    client = anthropic.Anthropic(api_key=api_key)
-    chat_loop(client)
+    client = anthropic.AsyncAnthropic(api_key=api_key)
+    asyncio.run(chat_loop(client))
@@ -0,0 +1,31 @@
+import contextlib
+import os
+
+try:
+    import fcntl
+except ImportError:
+    # No flock on Windows; writers there are only serialised within a process
+    fcntl = None
+
+
+@contextlib.contextmanager
+def file_lock(path: str):
+    """
+    Hold an exclusive lock on `path` for the duration of the block.
+
+    The lock is an flock on a lock file that is created if needed, so it
+    serialises writers across processes as well as across threads (each
+    call opens its own file description). It is not re-entrant: do not
+    take the same lock twice in one thread.
+    """
+    lock_dir = os.path.dirname(path)
+    if lock_dir:
+        os.makedirs(lock_dir, exist_ok=True)
+    with open(path, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
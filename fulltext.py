@@ -0,0 +1,197 @@
+import multiprocessing
+import os
+import sys
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from paper_storage import PaperStorage, get_storage
+
+
+# Number of PDFs downloaded at the same time
+DOWNLOAD_CONCURRENCY = int(os.getenv("FULLTEXT_CONCURRENCY", "4"))
+# Number of processes extracting text from downloaded PDFs
+EXTRACT_WORKERS = int(os.getenv("FULLTEXT_WORKERS", str(min(os.cpu_count() or 1, 4))))
+DOWNLOAD_TIMEOUT = float(os.getenv("FULLTEXT_TIMEOUT", "60"))
+MAX_PDF_BYTES = int(os.getenv("FULLTEXT_MAX_MB", "50")) * 1024 * 1024
+# Fetch PDFs from {PDF_BASE_URL}/{paper_id} instead of the stored pdf_url,
+# e.g. http://127.0.0.1:8080/pdf for a local stand-in
+PDF_BASE_URL = os.getenv("FULLTEXT_PDF_URL")
+FULLTEXT_DIR = ".fulltext"
+
+
+def extract_text(pdf_path: str) -> str:
+    """Extract the text of every page of a PDF. Runs in a worker process."""
+    from pypdf import PdfReader
+
+    reader = PdfReader(pdf_path)
+    return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+class FulltextFetcher:
+    """
+    Downloads paper PDFs and extracts their text, caching both on disk.
+
+    Downloads go through a pool of `concurrency` threads sharing one pooled
+    HTTP session and are streamed to `<cache_dir>/<paper_id>.pdf`. Each
+    finished download is handed to a process pool for text extraction, and
+    the text is kept in `<cache_dir>/<paper_id>.txt` so later requests never
+    touch the network or the PDF again. Concurrent requests for the same
+    paper share one download.
+    """
+
+    def __init__(
+        self,
+        storage: PaperStorage,
+        cache_dir: str,
+        concurrency: int = DOWNLOAD_CONCURRENCY,
+        workers: int = EXTRACT_WORKERS,
+        pdf_base_url: Optional[str] = PDF_BASE_URL,
+    ):
+        self.storage = storage
+        self.cache_dir = cache_dir
+        self.pdf_base_url = pdf_base_url
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._downloads = ThreadPoolExecutor(max_workers=concurrency)
+        # Created on first use; forkserver keeps the workers clear of this
+        # process's threads and event loop
+        self._workers = workers
+        self._extractors = None
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def _path(self, paper_id: str, extension: str) -> str:
+        return os.path.join(self.cache_dir, f"{paper_id.replace('/', '_')}.{extension}")
+
+    def _extractor_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._extractors is None:
+                self._extractors = ProcessPoolExecutor(
+                    max_workers=self._workers,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                )
+            return self._extractors
+
+    def _download(self, paper_id: str, url: str) -> str:
+        pdf_path = self._path(paper_id, "pdf")
+        if os.path.exists(pdf_path):
+            return pdf_path
+
+        # Stream to a temporary file so a failed download never looks cached
+        tmp_path = f"{pdf_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with self._session.get(url, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                response.raise_for_status()
+                size = 0
+                with open(tmp_path, "wb") as pdf_file:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        size += len(chunk)
+                        if size > MAX_PDF_BYTES:
+                            raise ValueError(f"PDF is larger than {MAX_PDF_BYTES} bytes")
+                        pdf_file.write(chunk)
+            os.replace(tmp_path, pdf_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return pdf_path
+
+    def _save_text(self, paper_id: str, text: str) -> None:
+        text_path = self._path(paper_id, "txt")
+        tmp_path = f"{text_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as text_file:
+            text_file.write(text)
+        os.replace(tmp_path, text_path)
+
+    def _start(self, paper_id: str, url: str) -> Future:
+        """Return a future for the paper's text, starting a download unless one is running."""
+        with self._lock:
+            if paper_id in self._pending:
+                return self._pending[paper_id]
+            result = Future()
+            self._pending[paper_id] = result
+
+        def finish(future: Future) -> None:
+            with self._lock:
+                self._pending.pop(paper_id, None)
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+            else:
+                try:
+                    self._save_text(paper_id, future.result())
+                except OSError as e:
+                    print(f"Could not cache the text of {paper_id}: {str(e)}", file=sys.stderr)
+                result.set_result(future.result())
+
+        def extract(download: Future) -> None:
+            if download.exception() is not None:
+                finish(download)
+                return
+            try:
+                self._extractor_pool().submit(extract_text, download.result()).add_done_callback(finish)
+            except Exception as e:
+                failed = Future()
+                failed.set_exception(e)
+                finish(failed)
+
+        self._downloads.submit(self._download, paper_id, url).add_done_callback(extract)
+        return result
+
+    def fetch(self, paper_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Return the full text of stored papers, downloading the ones not cached yet.
+
+        Args:
+            paper_ids: The IDs of the papers to fetch
+
+        Returns:
+            {"text": ..., "cached": bool} or {"error": message}, keyed by paper ID
+        """
+        results = {}
+        missing = []
+        for paper_id in paper_ids:
+            try:
+                with open(self._path(paper_id, "txt"), "r") as text_file:
+                    results[paper_id] = {"text": text_file.read(), "cached": True}
+            except FileNotFoundError:
+                missing.append(paper_id)
+
+        futures = {}
+        papers = self.storage.get_papers(missing, fields=["pdf_url"]) if missing else {}
+        for paper_id in missing:
+            paper_info = papers.get(paper_id)
+            if paper_info is None:
+                results[paper_id] = {
+                    "error": f"There's no saved information related to paper {paper_id}."
+                }
+                continue
+            url = f"{self.pdf_base_url}/{paper_id}" if self.pdf_base_url else paper_info["pdf_url"]
+            futures[paper_id] = self._start(paper_id, url)
+
+        for paper_id, future in futures.items():
+            try:
+                results[paper_id] = {"text": future.result(), "cached": False}
+            except Exception as e:
+                results[paper_id] = {"error": f"Could not fetch the full text: {str(e)}"}
+        return {paper_id: results[paper_id] for paper_id in paper_ids}
+
+
+_fetchers = {}
+_fetchers_lock = threading.Lock()
+
+
+def get_fulltext_fetcher(paper_dir: str) -> FulltextFetcher:
+    """Return the process-wide full-text fetcher, caching under `paper_dir`/.fulltext."""
+    with _fetchers_lock:
+        if paper_dir not in _fetchers:
+            _fetchers[paper_dir] = FulltextFetcher(
+                get_storage(paper_dir), os.path.join(paper_dir, FULLTEXT_DIR)
+            )
+        return _fetchers[paper_dir]
@@ -0,0 +1,289 @@
+import argparse
+import fnmatch
+import gzip
+import json
+import os
+import random
+import re
+import sys
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from paper_storage import PaperStorage, get_storage
+
+
+PAPER_DIR = "papers"
+# Papers buffered across all topics before they are written out
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "5000"))
+# Seconds between progress lines
+PROGRESS_SECONDS = float(os.getenv("INGEST_PROGRESS_SECONDS", "5"))
+# Vocabulary of synthetic dumps, also used by benchmark.py
+WORDS = (
+    "language model reasoning retrieval agent graph neural attention transformer "
+    "diffusion policy reinforcement benchmark dataset alignment robustness vision "
+    "protein molecule quantum optimisation sparse federated causal inference"
+).split()
+
+
+def _clean(text: str) -> str:
+    # The dump wraps long titles and abstracts over several lines
+    return " ".join(text.split())
+
+
+def parse_record(record: Dict) -> Tuple[str, Dict, List[str]]:
+    """
+    Map one record of the arXiv metadata dump to the schema `search_papers` stores.
+
+    Returns:
+        The versioned paper ID (as `get_short_id` gives it), the paper
+        information and the record's categories, primary category first
+
+    Raises:
+        ValueError: If the record is not an object with a string ID and title
+    """
+    if not isinstance(record, dict):
+        raise ValueError("record is not an object")
+    if not isinstance(record.get("id"), str) or not isinstance(record.get("title"), str):
+        raise ValueError("record has no ID or title")
+
+    versions = record.get("versions") or [{"version": "v1"}]
+    paper_id = f"{record['id']}{versions[-1]['version']}"
+
+    if record.get("authors_parsed"):
+        authors = [
+            " ".join(part for part in (first, last, *suffix) if part)
+            for last, first, *suffix in record["authors_parsed"]
+        ]
+    else:
+        authors = [
+            name.strip() for name in re.split(r",| and ", record.get("authors") or "") if name.strip()
+        ]
+
+    # The first version's submission date is what the API reports as published
+    try:
+        published = str(parsedate_to_datetime(versions[0]["created"]).date())
+    except (KeyError, TypeError, ValueError):
+        published = record.get("update_date") or ""
+
+    paper_info = {
+        'title': _clean(record["title"]),
+        'authors': authors,
+        'summary': _clean(record.get("abstract") or ""),
+        'pdf_url': f"http://arxiv.org/pdf/{paper_id}",
+        'published': published,
+    }
+    return paper_id, paper_info, (record.get("categories") or "").split()
+
+
+class TopicRules:
+    """
+    Assigns dump records to topic folders.
+
+    Each rule maps a topic name to optional "categories" (patterns such as
+    "cs.CL" or "cs.*") and "keywords" (matched at word starts in the title
+    and summary, ignoring case). A paper belongs to a topic when it matches
+    every part the rule has, and it is stored once however many topics it
+    belongs to. Without rules, papers go to a topic named after their
+    primary category.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, Dict]] = None):
+        self.rules = []
+        for topic, rule in (rules or {}).items():
+            keywords = rule.get("keywords") or []
+            self.rules.append((
+                topic.lower().replace(" ", "_"),
+                rule.get("categories") or [],
+                re.compile(
+                    r"\b(?:" + "|".join(re.escape(keyword) for keyword in keywords) + ")",
+                    re.IGNORECASE,
+                ) if keywords else None,
+            ))
+
+    @classmethod
+    def from_file(cls, path: str) -> "TopicRules":
+        with open(path, "r") as rules_file:
+            return cls(json.load(rules_file))
+
+    def topics_for(self, paper_info: Dict, categories: List[str]) -> List[str]:
+        if not self.rules:
+            return [categories[0].lower()] if categories else []
+
+        text = None
+        topics = []
+        for topic_dir, patterns, keywords in self.rules:
+            if patterns and not any(
+                fnmatch.fnmatchcase(category, pattern)
+                for pattern in patterns for category in categories
+            ):
+                continue
+            if keywords is not None:
+                if text is None:
+                    text = f"{paper_info['title']}\n{paper_info['summary']}"
+                if not keywords.search(text):
+                    continue
+            topics.append(topic_dir)
+        return topics
+
+
+def read_dump(path: str) -> Iterator[Tuple[Optional[Dict], int]]:
+    """
+    Yield each record of a JSON Lines dump, plain or gzipped, one at a time.
+
+    Each record comes with the number of bytes of the file read so far;
+    lines that are not valid JSON are yielded as None.
+    """
+    with open(path, "rb") as raw:
+        stream = gzip.GzipFile(fileobj=raw) if path.endswith(".gz") else raw
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                record = None
+            yield record, raw.tell()
+
+
+def ingest(
+    path: str,
+    storage: PaperStorage,
+    rules: TopicRules,
+    batch_size: int = BATCH_SIZE,
+    limit: Optional[int] = None,
+    progress_seconds: float = PROGRESS_SECONDS,
+) -> Dict:
+    """
+    Stream a metadata dump into storage and return counts and throughput.
+
+    At most `batch_size` papers are buffered; each flush stores every
+    buffered topic with one `add_papers` call, inside the storage's
+    `bulk_load`, so memory does not grow with the size of the dump.
+    Records that are not valid JSON or lack the expected fields are
+    counted as invalid and skipped.
+    """
+    total_bytes = os.path.getsize(path)
+    stats = {"read": 0, "matched": 0, "skipped": 0, "invalid": 0, "topics": set()}
+    batches = {}
+    buffered = 0
+    started = last_report = time.perf_counter()
+
+    def flush() -> None:
+        nonlocal buffered
+        for topic_dir, papers in batches.items():
+            storage.add_papers(topic_dir, papers)
+            stats["topics"].add(topic_dir)
+        batches.clear()
+        buffered = 0
+
+    def report(position: int) -> None:
+        elapsed = time.perf_counter() - started
+        print(
+            f"{stats['read']} read, {stats['matched']} matched into {len(stats['topics'])} topics, "
+            f"{stats['skipped']} unmatched, {stats['invalid']} invalid; "
+            f"{position / 2 ** 20:.0f}/{total_bytes / 2 ** 20:.0f} MB, "
+            f"{stats['read'] / elapsed if elapsed else 0:.0f} records/s",
+            file=sys.stderr,
+        )
+
+    position = 0
+    with storage.bulk_load():
+        for record, position in read_dump(path):
+            if limit is not None and stats["read"] >= limit:
+                break
+            stats["read"] += 1
+            try:
+                paper_id, paper_info, categories = parse_record(record)
+            except (AttributeError, KeyError, TypeError, ValueError):
+                stats["invalid"] += 1
+                continue
+
+            topics = rules.topics_for(paper_info, categories)
+            if not topics:
+                stats["skipped"] += 1
+                continue
+            stats["matched"] += 1
+            for topic_dir in topics:
+                batches.setdefault(topic_dir, {})[paper_id] = paper_info
+                buffered += 1
+
+            if buffered >= batch_size:
+                flush()
+            now = time.perf_counter()
+            if progress_seconds and now - last_report >= progress_seconds:
+                report(position)
+                last_report = now
+
+        flush()
+    report(position)
+    elapsed = time.perf_counter() - started
+    stats["topics"] = len(stats["topics"])
+    stats["seconds"] = elapsed
+    stats["records_per_second"] = stats["read"] / elapsed if elapsed else 0.0
+    return stats
+
+
+def write_synthetic_dump(path: str, records: int, seed: int = 0) -> None:
+    """Write `records` made-up records in the format of the arXiv metadata dump."""
+    rng = random.Random(seed)
+    categories = ["cs.CL", "cs.LG", "cs.CV", "cs.AI", "cs.RO", "stat.ML", "q-bio.BM", "quant-ph"]
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wt") as dump:
+        for i in range(records):
+            authors = [(f"Last{rng.randrange(5000)}", f"F{rng.randrange(26)}.", "") for _ in range(rng.randint(1, 5))]
+            created = f"Mon, {rng.randint(1, 28)} Jan 20{rng.randint(10, 25)} 12:00:00 GMT"
+            dump.write(json.dumps({
+                "id": f"{2000 + i // 100000:04d}.{i % 100000:05d}",
+                "submitter": authors[0][1] + " " + authors[0][0],
+                "authors": ", ".join(f"{first} {last}" for last, first, _ in authors),
+                "title": " ".join(rng.choices(WORDS, k=8)).title(),
+                "comments": None,
+                "journal-ref": None,
+                "doi": None,
+                "categories": " ".join(rng.sample(categories, rng.randint(1, 3))),
+                "abstract": "  " + "\n".join(
+                    " ".join(rng.choices(WORDS, k=15)) for _ in range(rng.randint(5, 12))
+                ) + "\n",
+                "versions": [{"version": f"v{v + 1}", "created": created} for v in range(rng.randint(1, 3))],
+                "update_date": f"20{rng.randint(10, 25)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+                "authors_parsed": [list(author) for author in authors],
+            }) + "\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load an arXiv metadata dump (JSON Lines, optionally gzipped) into paper storage."
+    )
+    parser.add_argument("dump", help="Path of the dump, e.g. arxiv-metadata-oai-snapshot.json")
+    parser.add_argument("--rules", help="JSON file mapping topic names to categories and keywords")
+    parser.add_argument("--paper-dir", default=PAPER_DIR)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--limit", type=int, help="Stop after this many records")
+    parser.add_argument("--progress-seconds", type=float, default=PROGRESS_SECONDS)
+    parser.add_argument(
+        "--make-synthetic",
+        type=int,
+        metavar="RECORDS",
+        help="Write a synthetic dump with this many records to DUMP instead of loading it",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.make_synthetic is not None:
+        write_synthetic_dump(args.dump, args.make_synthetic, args.seed)
+        print(f"Wrote {args.make_synthetic} records to {args.dump}")
+    else:
+        rules = TopicRules.from_file(args.rules) if args.rules else TopicRules()
+        stats = ingest(
+            args.dump,
+            get_storage(args.paper_dir),
+            rules,
+            batch_size=args.batch_size,
+            limit=args.limit,
+            progress_seconds=args.progress_seconds,
+        )
+        print(
+            f"Stored {stats['matched']} papers in {stats['topics']} topics from {stats['read']} records "
+            f"in {stats['seconds']:.1f}s ({stats['records_per_second']:.0f} records/s)"
+        )
@@ -0,0 +1,219 @@
+import heapq
+import json
+import math
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, List, Optional
+
+from paper_storage import PaperStorage, get_storage
+
+
+# Seconds between checks for topics written by other processes
+INDEX_REFRESH = float(os.getenv("LOCAL_SEARCH_REFRESH", "30"))
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+# Title terms count this many times, so a match in the title outranks one in the summary
+TITLE_WEIGHT = 2
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from in into is it of on or that the this to we with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase alphanumeric terms, dropping common stopwords."""
+    return [term for term in re.findall(r"[a-z0-9]+", text.lower()) if term not in STOPWORDS]
+
+
+def paper_terms(paper_info: Dict) -> Counter:
+    """Count the indexed terms of a paper's title, summary and authors."""
+    terms = Counter(tokenize(paper_info.get("summary", "")))
+    for term in tokenize(paper_info.get("title", "")):
+        terms[term] += TITLE_WEIGHT
+    for author in paper_info.get("authors", []):
+        terms.update(tokenize(author))
+    return terms
+
+
+class LocalSearchIndex:
+    """
+    In-memory inverted index over the stored papers, ranked with BM25.
+
+    The index is built from storage on first use and then updated
+    incrementally: `add_papers` indexes papers as they are stored, and topics
+    whose storage version changed (for example, written by another process)
+    are re-read at most every `refresh_seconds`. A paper stored under several
+    topics is indexed once and remembers all of them.
+    """
+
+    def __init__(self, storage: PaperStorage, refresh_seconds: float = INDEX_REFRESH):
+        self.storage = storage
+        self.refresh_seconds = refresh_seconds
+        # term -> {paper_id: term frequency}
+        self._postings = {}
+        # paper_id -> {"terms", "length", "title", "published", "topics", "source"}
+        self._docs = {}
+        self._total_length = 0
+        self._topic_versions = {}
+        self._checked_at = None
+        self._lock = threading.RLock()
+
+    def _index_paper(self, paper_id: str, paper_info: Dict, topic_dir: str) -> None:
+        source = (paper_info.get("title"), paper_info.get("summary"), paper_info.get("authors"))
+        doc = self._docs.get(paper_id)
+        if doc is not None and doc["source"] == source:
+            doc["topics"].add(topic_dir)
+            return
+
+        topics = {topic_dir}
+        if doc is not None:
+            topics |= doc["topics"]
+            self._remove_paper(paper_id)
+
+        terms = paper_terms(paper_info)
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[paper_id] = count
+        length = sum(terms.values())
+        self._total_length += length
+        self._docs[paper_id] = {
+            "terms": list(terms),
+            "length": length,
+            "title": paper_info.get("title", ""),
+            "published": paper_info.get("published", ""),
+            "topics": topics,
+            "source": source,
+        }
+
+    def _remove_paper(self, paper_id: str) -> None:
+        doc = self._docs.pop(paper_id)
+        self._total_length -= doc["length"]
+        for term in doc["terms"]:
+            postings = self._postings[term]
+            del postings[paper_id]
+            if not postings:
+                del self._postings[term]
+
+    def _reindex_topic(self, topic_dir: str) -> None:
+        try:
+            papers = self.storage.get_topic_papers(topic_dir) or {}
+        except json.JSONDecodeError as e:
+            print(f"Error reading topic {topic_dir}: {str(e)}", file=sys.stderr)
+            return
+        for paper_id, paper_info in papers.items():
+            self._index_paper(paper_id, paper_info, topic_dir)
+        # Forget the topic on papers it no longer holds
+        for paper_id in [
+            paper_id for paper_id, doc in self._docs.items()
+            if topic_dir in doc["topics"] and paper_id not in papers
+        ]:
+            doc = self._docs[paper_id]
+            doc["topics"].discard(topic_dir)
+            if not doc["topics"]:
+                self._remove_paper(paper_id)
+
+    def refresh(self, force: bool = False) -> None:
+        """Re-read the topics whose storage version changed since they were indexed."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.refresh_seconds:
+                return
+            self._checked_at = now
+
+            topics = set(self.storage.list_topics())
+            for topic_dir in topics:
+                version = self.storage.topic_version(topic_dir)
+                if self._topic_versions.get(topic_dir) != version:
+                    self._reindex_topic(topic_dir)
+                    self._topic_versions[topic_dir] = version
+            for topic_dir in set(self._topic_versions) - topics:
+                del self._topic_versions[topic_dir]
+                self._reindex_topic(topic_dir)
+
+    def add_papers(self, topic_dir: str, papers: Dict[str, Dict]) -> None:
+        """Index papers that were just stored under `topic_dir`."""
+        with self._lock:
+            for paper_id, paper_info in papers.items():
+                self._index_paper(paper_id, paper_info, topic_dir)
+
+    def search(
+        self,
+        query: str,
+        max_results: int = 10,
+        topic_dir: Optional[str] = None,
+        published_after: Optional[str] = None,
+        published_before: Optional[str] = None,
+    ) -> List[Dict]:
+        """
+        Rank the stored papers against a query with BM25.
+
+        Args:
+            query: Free-text query matched against titles, summaries and authors
+            max_results: Maximum number of papers to return
+            topic_dir: Only return papers stored under this topic folder
+            published_after: Only return papers published on or after this date (YYYY-MM-DD)
+            published_before: Only return papers published on or before this date (YYYY-MM-DD)
+
+        Returns:
+            The best matches, highest score first
+        """
+        self.refresh()
+        with self._lock:
+            if not self._docs:
+                return []
+            total_docs = len(self._docs)
+            avg_length = self._total_length / total_docs
+
+            scores = Counter()
+            for term in set(tokenize(query)):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                for paper_id, count in postings.items():
+                    length = self._docs[paper_id]["length"]
+                    scores[paper_id] += idf * count * (K1 + 1) / (
+                        count + K1 * (1 - B + B * length / avg_length)
+                    )
+
+            def wanted(paper_id: str) -> bool:
+                doc = self._docs[paper_id]
+                if topic_dir is not None and topic_dir not in doc["topics"]:
+                    return False
+                if published_after and doc["published"] < published_after:
+                    return False
+                if published_before and doc["published"] > published_before:
+                    return False
+                return True
+
+            best = heapq.nlargest(
+                max_results,
+                (item for item in scores.items() if wanted(item[0])),
+                key=lambda item: item[1],
+            )
+            return [
+                {
+                    "paper_id": paper_id,
+                    "title": self._docs[paper_id]["title"],
+                    "published": self._docs[paper_id]["published"],
+                    "topics": sorted(self._docs[paper_id]["topics"]),
+                    "score": round(score, 4),
+                }
+                for paper_id, score in best
+            ]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_search_index(paper_dir: str) -> LocalSearchIndex:
+    """Return the process-wide search index for the storage of `paper_dir`."""
+    with _indexes_lock:
+        if paper_dir not in _indexes:
+            _indexes[paper_dir] = LocalSearchIndex(get_storage(paper_dir))
+        return _indexes[paper_dir]
@@ -1,136 +1,472 @@
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
 from mcp import ClientSession, StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
 from contextlib import AsyncExitStack
+from urllib.parse import urlparse
 import json
+import os
+import subprocess
+import time
 import asyncio
-import nest_asyncio
 
-nest_asyncio.apply()
+from tracing import TRACE_PATH, Tracer
+
+# Tool, prompt and resource listings saved from earlier runs, per server
+CATALOG_PATH = "mcp_catalog.json"
 
 
 class MCP_ChatBot:
-    def __init__(self):
-        self.exit_stack = AsyncExitStack()
-        self.anthropic = Anthropic()
+    def __init__(
+        self,
+        max_parallel_tools=4,
+        tool_timeout=60.0,
+        lazy=False,
+        catalog_path=CATALOG_PATH,
+        session_mode=False,
+        context_budget=50000,
+        max_tool_result_chars=8000,
+        trace=None,
+        trace_path=TRACE_PATH,
+        daemon_start_timeout=30.0,
+    ):
+        self.anthropic = AsyncAnthropic()
         # Tools list required for Anthropic API
         self.available_tools = []
         # Prompts list for quick display 
         self.available_prompts = []
-        # Sessions dict maps tool/prompt names or resource URIs to MCP client sessions
+        # Servers dict maps tool/prompt names or resource URIs to server names
+        self.servers = {}
+        # Server configs from server_config.json and sessions of the running servers
+        self.server_configs = {}
         self.sessions = {}
+        # Futures resolving to the session of each server that is starting or running
+        self._starting = {}
+        # Tasks that own each server connection until shutdown is set
+        self._server_tasks = {}
+        self._shutdown = asyncio.Event()
+        # Tool calls from one assistant turn run concurrently, up to this many at once
+        self.max_parallel_tools = max_parallel_tools
+        # Seconds to wait for a single tool call before reporting it as failed
+        self.tool_timeout = tool_timeout
+        # In lazy mode, servers with a cached catalog only start when first used
+        self.lazy = lazy
+        self.catalog_path = catalog_path
+        # In session mode, earlier turns are kept and resent with each query
+        self.session_mode = session_mode
+        self.history = []
+        # Approximate token budget for the kept turns plus the current one
+        self.context_budget = context_budget
+        # Tool results in earlier turns are cut to this size when over budget
+        self.max_tool_result_chars = max_tool_result_chars
+        # Spans for turns, LLM calls, tool calls, resource reads and server
+        # starts; trace is None (off), "memory", "json" or "otlp"
+        self.tracer = Tracer(trace, trace_path)
+        # Seconds to wait for a spawned server daemon to accept connections
+        self.daemon_start_timeout = daemon_start_timeout
 
-    async def connect_to_server(self, server_name, server_config):
+    async def _daemon_listening(self, url):
+        parsed = urlparse(url)
         try:
-            server_params = StdioServerParameters(**server_config)
-            stdio_transport = await self.exit_stack.enter_async_context(
-                stdio_client(server_params)
+            _, writer = await asyncio.wait_for(
+                asyncio.open_connection(parsed.hostname, parsed.port or 80), timeout=1.0
             )
-            read, write = stdio_transport
-            session = await self.exit_stack.enter_async_context(
-                ClientSession(read, write)
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+
+    async def _start_daemon(self, server_name, config, daemon_args):
+        """Spawn a server daemon detached from the chatbot and wait until it listens."""
+        print(f"Starting {server_name} daemon")
+        with open(f"{server_name}_daemon.log", "a") as log:
+            process = subprocess.Popen(
+                [config["command"], *daemon_args],
+                cwd=config.get("cwd"),
+                env={**os.environ, **(config.get("env") or {})},
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                # Keep the daemon running after the chatbot exits
+                start_new_session=True,
             )
-            await session.initialize()
-            
-            
-            try:
-                # List available tools
-                response = await session.list_tools()
-                for tool in response.tools:
-                    self.sessions[tool.name] = session
-                    self.available_tools.append({
-                        "name": tool.name,
-                        "description": tool.description,
-                        "input_schema": tool.inputSchema
-                    })
-            
-                # List available prompts
-                prompts_response = await session.list_prompts()
-                if prompts_response and prompts_response.prompts:
-                    for prompt in prompts_response.prompts:
-                        self.sessions[prompt.name] = session
-                        self.available_prompts.append({
-                            "name": prompt.name,
-                            "description": prompt.description,
-                            "arguments": prompt.arguments
-                        })
-                # List available resources
-                resources_response = await session.list_resources()
-                if resources_response and resources_response.resources:
-                    for resource in resources_response.resources:
-                        resource_uri = str(resource.uri)
-                        self.sessions[resource_uri] = session
-            
-            except Exception as e:
-                print(f"Error {e}")
+        deadline = time.monotonic() + self.daemon_start_timeout
+        while time.monotonic() < deadline:
+            if await self._daemon_listening(config["url"]):
+                return True
+            # The port may be taken by a daemon another chatbot started
+            # at the same time; give that one a last chance before giving up
+            if process.poll() is not None:
+                await asyncio.sleep(0.5)
+                return await self._daemon_listening(config["url"])
+            await asyncio.sleep(0.2)
+        return False
+
+    async def _open_transport(self, server_name, exit_stack):
+        """
+        Enter the client for a server and return its streams and transport.
+
+        Servers with a "url" in their config are attached to over streamable
+        HTTP. If nothing listens there, the daemon is spawned with
+        "daemon_args"; if that fails too, the server runs over stdio.
+        """
+        config = self.server_configs[server_name]
+        url = config.get("url")
+        if url:
+            listening = await self._daemon_listening(url)
+            if not listening and config.get("daemon_args") and config.get("command"):
+                listening = await self._start_daemon(server_name, config, config["daemon_args"])
+            if listening:
+                read, write, _ = await exit_stack.enter_async_context(streamablehttp_client(url))
+                return read, write, "http"
+            if not config.get("command"):
+                raise ConnectionError(f"Nothing is listening at {url}")
+            print(f"No {server_name} daemon at {url}; running it over stdio")
+        
+        server_params = StdioServerParameters(**{
+            key: value for key, value in config.items() if key not in ("url", "daemon_args")
+        })
+        read, write = await exit_stack.enter_async_context(stdio_client(server_params))
+        return read, write, "stdio"
+
+    async def _run_server(self, server_name, ready):
+        # The client and session are entered and exited in this task, as
+        # their cancel scopes require, so servers can start concurrently
+        start = time.perf_counter()
+        try:
+            async with AsyncExitStack() as exit_stack:
+                with self.tracer.span("initialize", "server_start", server=server_name) as span:
+                    read, write, transport = await self._open_transport(server_name, exit_stack)
+                    span.set(transport=transport)
+                    session = await exit_stack.enter_async_context(
+                        ClientSession(read, write)
+                    )
+                    await session.initialize()
+                if transport == "http":
+                    print(f"Attached to {server_name} daemon in {time.perf_counter() - start:.2f}s")
+                else:
+                    print(f"Started {server_name} in {time.perf_counter() - start:.2f}s")
                 
+                self.sessions[server_name] = session
+                ready.set_result(session)
+                await self._shutdown.wait()
+        except Exception as e:
+            if not ready.done():
+                ready.set_exception(e)
+            else:
+                print(f"Server {server_name} stopped: {e}")
+        finally:
+            self.sessions.pop(server_name, None)
+            self._starting.pop(server_name, None)
+
+    async def start_server(self, server_name):
+        """Return the session for a server, starting the server if needed."""
+        if server_name not in self._starting:
+            ready = asyncio.get_running_loop().create_future()
+            self._starting[server_name] = ready
+            self._server_tasks[server_name] = asyncio.create_task(
+                self._run_server(server_name, ready)
+            )
+        return await asyncio.shield(self._starting[server_name])
+
+    async def get_session(self, name):
+        """Return the session serving a tool, prompt or resource URI, or None."""
+        server_name = self.servers.get(name)
+        if server_name is None:
+            return None
+        try:
+            return await self.start_server(server_name)
         except Exception as e:
             print(f"Error connecting to {server_name}: {e}")
+            return None
+
+    async def connect_to_server(self, server_name):
+        """Start a server and return its catalog of tools, prompts and resources."""
+        try:
+            session = await self.start_server(server_name)
+        except Exception as e:
+            print(f"Error connecting to {server_name}: {e}")
+            return None
+        
+        catalog = {"tools": [], "prompts": [], "resources": []}
+        try:
+            # List available tools
+            response = await session.list_tools()
+            for tool in response.tools:
+                catalog["tools"].append({
+                    "name": tool.name,
+                    "description": tool.description,
+                    "input_schema": tool.inputSchema
+                })
+        
+            # List available prompts
+            prompts_response = await session.list_prompts()
+            if prompts_response and prompts_response.prompts:
+                for prompt in prompts_response.prompts:
+                    catalog["prompts"].append({
+                        "name": prompt.name,
+                        "description": prompt.description,
+                        "arguments": [arg.model_dump() for arg in prompt.arguments or []]
+                    })
+            # List available resources
+            resources_response = await session.list_resources()
+            if resources_response and resources_response.resources:
+                for resource in resources_response.resources:
+                    catalog["resources"].append(str(resource.uri))
+        
+        except Exception as e:
+            print(f"Error {e}")
+        
+        return catalog
+
+    def register_catalog(self, server_name, catalog):
+        for tool in catalog["tools"]:
+            self.servers[tool["name"]] = server_name
+            self.available_tools.append(tool)
+        for prompt in catalog["prompts"]:
+            self.servers[prompt["name"]] = server_name
+            self.available_prompts.append(prompt)
+        for resource_uri in catalog["resources"]:
+            self.servers[resource_uri] = server_name
+
+    def load_catalog(self):
+        try:
+            with open(self.catalog_path, "r") as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save_catalog(self, catalog):
+        tmp_path = f"{self.catalog_path}.tmp"
+        with open(tmp_path, "w") as file:
+            json.dump(catalog, file, indent=2)
+        os.replace(tmp_path, self.catalog_path)
 
     async def connect_to_servers(self):
         try:
             with open("server_config.json", "r") as file:
                 data = json.load(file)
-            servers = data.get("mcpServers", {})
-            for server_name, server_config in servers.items():
-                await self.connect_to_server(server_name, server_config)
+            self.server_configs = data.get("mcpServers", {})
         except Exception as e:
             print(f"Error loading server config: {e}")
             raise
+        
+        start = time.perf_counter()
+        catalog = self.load_catalog()
+        
+        # In lazy mode, servers whose catalog matches their config are not started
+        to_start = [
+            server_name for server_name, server_config in self.server_configs.items()
+            if not (self.lazy and catalog.get(server_name, {}).get("config") == server_config)
+        ]
+        results = await asyncio.gather(
+            *(self.connect_to_server(server_name) for server_name in to_start)
+        )
+        started = dict(zip(to_start, results))
+        
+        # Register in config order so the tool list is the same on every run
+        for server_name, server_config in self.server_configs.items():
+            if server_name in started:
+                server_catalog = started[server_name]
+                if server_catalog is None:
+                    continue
+                catalog[server_name] = {**server_catalog, "config": server_config}
+            else:
+                print(f"Loaded {server_name} from catalog; it starts on first use")
+            self.register_catalog(server_name, catalog[server_name])
+        
+        try:
+            self.save_catalog(catalog)
+        except OSError as e:
+            print(f"Error saving server catalog: {e}")
+        print(f"Servers ready in {time.perf_counter() - start:.2f}s")
     
+    def estimate_tokens(self, messages):
+        # Roughly four characters per token is close enough for budgeting
+        return len(json.dumps(messages, default=str)) // 4
+
+    def trim_history(self, turn):
+        """Shrink or drop earlier turns until they fit the context budget with `turn`."""
+        def total():
+            return self.estimate_tokens(self.history) + self.estimate_tokens(turn)
+        
+        # Cut oversized tool results in earlier turns first, oldest first
+        for past_turn in self.history:
+            if total() <= self.context_budget:
+                return
+            for message in past_turn:
+                if message['role'] != 'user' or isinstance(message['content'], str):
+                    continue
+                for block in message['content']:
+                    if block.get('type') != 'tool_result' or not isinstance(block['content'], list):
+                        continue
+                    for item in block['content']:
+                        text = item.get('text')
+                        if text and len(text) > self.max_tool_result_chars:
+                            cut = len(text) - self.max_tool_result_chars
+                            item['text'] = text[:self.max_tool_result_chars] + f"\n[... {cut} characters omitted]"
+        
+        # Then drop whole turns, oldest first
+        while self.history and total() > self.context_budget:
+            self.history.pop(0)
+
+    def request_tools(self):
+        # A cache breakpoint on the last tool caches the whole tool list
+        if not self.available_tools:
+            return []
+        return self.available_tools[:-1] + [
+            {**self.available_tools[-1], "cache_control": {"type": "ephemeral"}}
+        ]
+
+    def request_messages(self, messages):
+        # A cache breakpoint on the newest block caches the conversation so
+        # far, and the next request in the turn reads that prefix from cache
+        last = messages[-1]
+        content = last['content']
+        if isinstance(content, str):
+            content = [{"type": "text", "text": content}]
+        content = content[:-1] + [{**content[-1], "cache_control": {"type": "ephemeral"}}]
+        return messages[:-1] + [{**last, 'content': content}]
+
     async def process_query(self, query):
-        messages = [{'role':'user', 'content':query}]
+        with self.tracer.span("turn", "turn", query=query):
+            await self._process_turn(query)
+
+    async def _process_turn(self, query):
+        turn = [{'role':'user', 'content':query}]
         
         while True:
-            response = self.anthropic.messages.create(
-                max_tokens = 2024,
-                model = 'claude-3-7-sonnet-20250219', 
-                tools = self.available_tools,
-                messages = messages
-            )
+            if self.session_mode:
+                self.trim_history(turn)
+            messages = [message for past_turn in self.history for message in past_turn] + turn
+            request_messages = self.request_messages(messages)
             
-            assistant_content = []
-            has_tool_use = False
+            # Tool calls from this turn run concurrently, up to max_parallel_tools at once
+            semaphore = asyncio.Semaphore(self.max_parallel_tools)
+            tool_tasks = []
             
-            for content in response.content:
-                if content.type == 'text':
-                    print(content.text)
-                    assistant_content.append(content)
-                elif content.type == 'tool_use':
-                    has_tool_use = True
-                    assistant_content.append(content)
-                    messages.append({'role':'assistant', 'content':assistant_content})
-                    
-                    # Get session and call tool
-                    session = self.sessions.get(content.name)
-                    if not session:
-                        print(f"Tool '{content.name}' not found.")
-                        break
-                        
-                    result = await session.call_tool(content.name, arguments=content.input)
-                    messages.append({
-                        "role": "user", 
-                        "content": [
-                            {
-                                "type": "tool_result",
-                                "tool_use_id": content.id,
-                                "content": result.content
-                            }
-                        ]
-                    })
+            # Stream the response so text prints as it arrives and each tool
+            # call starts as soon as its tool_use block is complete. Tool calls
+            # are traced as part of the turn, not of this LLM call
+            try:
+                with self.tracer.span(
+                    "messages.stream",
+                    "llm",
+                    current=False,
+                    model='claude-3-7-sonnet-20250219',
+                    request_bytes=len(json.dumps(request_messages, default=str)),
+                ) as llm_span:
+                    start = time.perf_counter()
+                    first_token = None
+                    async with self.anthropic.messages.stream(
+                        max_tokens = 2024,
+                        model = 'claude-3-7-sonnet-20250219', 
+                        tools = self.request_tools(),
+                        messages = request_messages
+                    ) as stream:
+                        async for event in stream:
+                            if first_token is None:
+                                first_token = time.perf_counter() - start
+                            if event.type == 'text':
+                                print(event.text, end='', flush=True)
+                            elif event.type == 'content_block_stop':
+                                if event.content_block.type == 'text':
+                                    print()
+                                elif event.content_block.type == 'tool_use':
+                                    tool_tasks.append(asyncio.create_task(
+                                        self.call_tool(event.content_block, semaphore)
+                                    ))
+                        response = await stream.get_final_message()
+                    usage = response.usage
+                    llm_span.set(
+                        first_event_seconds=first_token or 0.0,
+                        input_tokens=usage.input_tokens,
+                        output_tokens=usage.output_tokens,
+                        cache_read_input_tokens=usage.cache_read_input_tokens or 0,
+                        cache_creation_input_tokens=usage.cache_creation_input_tokens or 0,
+                        stop_reason=str(response.stop_reason),
+                        tool_calls=len(tool_tasks),
+                    )
+            except BaseException:
+                for task in tool_tasks:
+                    task.cancel()
+                raise
+            
+            turn.append({
+                'role':'assistant',
+                'content':[block.model_dump(exclude_none=True) for block in response.content]
+            })
             
             # Exit loop if no tool was used
-            if not has_tool_use:
+            if not tool_tasks:
                 break
+            
+            # Send all the tool results back together, in the order the tools
+            # were requested
+            tool_results = await asyncio.gather(*tool_tasks)
+            turn.append({"role": "user", "content": tool_results})
+        
+        if self.session_mode:
+            self.history.append(turn)
+
+    async def call_tool(self, tool_use, semaphore):
+        """Call a requested tool and return its tool_result block."""
+        with self.tracer.span(
+            tool_use.name,
+            "tool",
+            server=self.servers.get(tool_use.name, "-"),
+            argument_bytes=len(json.dumps(tool_use.input, default=str)),
+        ) as span:
+            result_block = await self._call_tool(tool_use, semaphore)
+            content = result_block["content"]
+            span.set(
+                result_bytes=len(content if isinstance(content, str) else json.dumps(content)),
+                is_error=result_block.get("is_error", False),
+            )
+            return result_block
+
+    async def _call_tool(self, tool_use, semaphore):
+        result_block = {"type": "tool_result", "tool_use_id": tool_use.id}
+        
+        # Get session, starting its server if needed, and call tool
+        session = await self.get_session(tool_use.name)
+        if not session:
+            print(f"Tool '{tool_use.name}' not found.")
+            return {**result_block, "content": f"Tool '{tool_use.name}' not found.", "is_error": True}
+        
+        async with semaphore:
+            try:
+                result = await asyncio.wait_for(
+                    session.call_tool(tool_use.name, arguments=tool_use.input),
+                    timeout=self.tool_timeout
+                )
+            except asyncio.TimeoutError:
+                message = f"Tool '{tool_use.name}' timed out after {self.tool_timeout}s."
+                print(message)
+                return {**result_block, "content": message, "is_error": True}
+            except Exception as e:
+                print(f"Error calling tool '{tool_use.name}': {e}")
+                return {**result_block, "content": f"Error: {e}", "is_error": True}
+        
+        return {
+            **result_block,
+            "content": [item.model_dump(exclude_none=True) for item in result.content]
+        }
 
     async def get_resource(self, resource_uri):
-        session = self.sessions.get(resource_uri)
+        with self.tracer.span(
+            resource_uri, "resource", server=self.servers.get(resource_uri, "-")
+        ) as span:
+            await self._get_resource(resource_uri, span)
+
+    async def _get_resource(self, resource_uri, span):
+        session = await self.get_session(resource_uri)
         
         # Fallback for papers URIs - try any papers resource session
         if not session and resource_uri.startswith("papers://"):
-            for uri, sess in self.sessions.items():
+            for uri in list(self.servers):
                 if uri.startswith("papers://"):
-                    session = sess
+                    session = await self.get_session(uri)
                     break
             
         if not session:
@@ -140,6 +476,7 @@ class MCP_ChatBot:
         try:
             result = await session.read_resource(uri=resource_uri)
             if result and result.contents:
+                span.set(result_bytes=sum(len(getattr(item, "text", "")) for item in result.contents))
                 print(f"\nResource: {resource_uri}")
                 print("Content:")
                 print(result.contents[0].text)
@@ -165,7 +502,7 @@ class MCP_ChatBot:
     
     async def execute_prompt(self, prompt_name, args):
         """Execute a prompt with the given arguments."""
-        session = self.sessions.get(prompt_name)
+        session = await self.get_session(prompt_name)
         if not session:
             print(f"Prompt '{prompt_name}' not found.")
             return
@@ -195,8 +532,13 @@ class MCP_ChatBot:
         print("Type your queries or 'quit' to exit.")
         print("Use @folders to see available topics")
         print("Use @<topic> to search papers in that topic")
+        print("Use @<topic>?page=N to see later pages of a large topic")
         print("Use /prompts to list available prompts")
         print("Use /prompt <name> <arg1=value1> to execute a prompt")
+        if self.session_mode:
+            print("Use /clear to start a new conversation")
+        if self.tracer.enabled:
+            print("Use /stats [N] to see where the last N turns spent their time")
         
         while True:
             try:
@@ -225,6 +567,12 @@ class MCP_ChatBot:
                     
                     if command == '/prompts':
                         await self.list_prompts()
+                    elif command == '/stats':
+                        count = int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 1
+                        self.tracer.print_stats(count)
+                    elif command == '/clear':
+                        self.history = []
+                        print("Conversation cleared.")
                     elif command == '/prompt':
                         if len(parts) < 2:
                             print("Usage: /prompt <name> <arg1=value1> <arg2=value2>")
@@ -250,11 +598,17 @@ class MCP_ChatBot:
                 print(f"\nError: {str(e)}")
     
     async def cleanup(self):
-        await self.exit_stack.aclose()
+        self._shutdown.set()
+        await asyncio.gather(*self._server_tasks.values(), return_exceptions=True)
 
 
 async def main():
-    chatbot = MCP_ChatBot()
+    chatbot = MCP_ChatBot(
+        lazy=os.getenv("MCP_LAZY_SERVERS") == "1",
+        session_mode=os.getenv("MCP_SESSION_MODE") == "1",
+        trace=os.getenv("MCP_TRACE") or None,
+        trace_path=os.getenv("MCP_TRACE_FILE", TRACE_PATH),
+    )
     try:
         await chatbot.connect_to_servers()
         await chatbot.chat_loop()
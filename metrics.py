@@ -0,0 +1,179 @@
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from mcp.server.fastmcp import FastMCP
+
+from search_cache import get_search_cache
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# "stderr" or a file path: also write one JSON line per timed operation
+METRICS_LOG = os.getenv("RESEARCH_METRICS_LOG")
+
+
+def _label_text(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in labels.items()
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class Metrics:
+    """
+    In-process registry of latency histograms, error counts and in-flight gauges.
+
+    Operations are timed with `track(kind, name)`, where kind is "tool",
+    "resource" or "stage" (a step inside a tool, such as the arXiv fetch or
+    the storage write). `render` returns everything in the Prometheus text
+    format, together with values read from registered callbacks such as the
+    search cache counters. Each process keeps its own registry.
+    """
+
+    def __init__(self, log_target: Optional[str] = METRICS_LOG):
+        # (kind, name) -> [bucket counts..., +Inf count, sum]
+        self._histograms = {}
+        self._errors = {}
+        self._in_flight = {}
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._log = None
+        if log_target == "stderr":
+            self._log = sys.stderr
+        elif log_target:
+            self._log = open(log_target, "a", buffering=1)
+
+    def observe(self, kind: str, name: str, seconds: float, error: bool = False) -> None:
+        """Record one finished operation."""
+        key = (kind, name)
+        with self._lock:
+            histogram = self._histograms.setdefault(key, [0] * (len(BUCKETS) + 1) + [0.0])
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[i] += 1
+            histogram[len(BUCKETS)] += 1
+            histogram[-1] += seconds
+            if error:
+                self._errors[key] = self._errors.get(key, 0) + 1
+            if self._log is not None:
+                self._log.write(json.dumps({
+                    "ts": time.time(),
+                    "kind": kind,
+                    "name": name,
+                    "seconds": round(seconds, 6),
+                    "error": error,
+                }) + "\n")
+
+    @contextlib.contextmanager
+    def track(self, kind: str, name: str):
+        """Time the block, counting it as in flight while it runs and as an error if it raises."""
+        key = (kind, name)
+        with self._lock:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+        started = time.perf_counter()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            with self._lock:
+                self._in_flight[key] -= 1
+            self.observe(kind, name, time.perf_counter() - started, error)
+
+    def register_callback(self, name: str, help_text: str, kind: str, read: Callable[[], float]) -> None:
+        """Report `read()` as metric `name` of Prometheus type `kind` on every render."""
+        self._callbacks.append((name, help_text, kind, read))
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text exposition format."""
+        lines = [
+            "# HELP research_duration_seconds Latency of tools, resource reads and their stages.",
+            "# TYPE research_duration_seconds histogram",
+        ]
+        with self._lock:
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+            errors = dict(self._errors)
+            in_flight = dict(self._in_flight)
+
+        for (kind, name), histogram in sorted(histograms.items()):
+            labels = {"kind": kind, "name": name}
+            for i, bound in enumerate(BUCKETS):
+                lines.append(
+                    f"research_duration_seconds_bucket{_label_text({**labels, 'le': bound})} {histogram[i]}"
+                )
+            lines.append(
+                f"research_duration_seconds_bucket{_label_text({**labels, 'le': '+Inf'})} {histogram[len(BUCKETS)]}"
+            )
+            lines.append(f"research_duration_seconds_sum{_label_text(labels)} {histogram[-1]}")
+            lines.append(f"research_duration_seconds_count{_label_text(labels)} {histogram[len(BUCKETS)]}")
+
+        lines.append("# HELP research_errors_total Operations that raised an error.")
+        lines.append("# TYPE research_errors_total counter")
+        for (kind, name), count in sorted(errors.items()):
+            lines.append(f"research_errors_total{_label_text({'kind': kind, 'name': name})} {count}")
+
+        lines.append("# HELP research_in_flight Operations currently running.")
+        lines.append("# TYPE research_in_flight gauge")
+        for (kind, name), count in sorted(in_flight.items()):
+            lines.append(f"research_in_flight{_label_text({'kind': kind, 'name': name})} {count}")
+
+        for name, help_text, kind, read in self._callbacks:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {read()}")
+        return "\n".join(lines) + "\n"
+
+    def instrument(self, mcp: FastMCP) -> None:
+        """Time every tool call and resource read handled by `mcp`."""
+        server = mcp._mcp_server
+        call_tool = mcp.call_tool
+        read_resource = mcp.read_resource
+
+        def resource_name(uri) -> str:
+            # Label by template, so per-topic URIs do not each get a series
+            uri = str(uri)
+            manager = mcp._resource_manager
+            if uri in manager._resources:
+                return uri
+            for template in manager._templates.values():
+                if template.matches(uri) is not None:
+                    return template.uri_template
+            return "unknown"
+
+        # FastMCP registered its bound methods with the low-level server when
+        # it was created, so register timed wrappers in their place
+        @server.call_tool()
+        async def timed_call_tool(name: str, arguments: dict):
+            label = name if name in mcp._tool_manager._tools else "unknown"
+            with self.track("tool", label):
+                return await call_tool(name, arguments)
+
+        @server.read_resource()
+        async def timed_read_resource(uri):
+            with self.track("resource", resource_name(uri)):
+                return await read_resource(uri)
+
+
+metrics = Metrics()
+metrics.register_callback(
+    "research_search_cache_hits_total", "Searches answered from the search cache.", "counter",
+    lambda: get_search_cache().stats()["hits"],
+)
+metrics.register_callback(
+    "research_search_cache_misses_total", "Searches that went to arXiv.", "counter",
+    lambda: get_search_cache().stats()["misses"],
+)
+metrics.register_callback(
+    "research_search_cache_hit_ratio", "Share of searches answered from the search cache.", "gauge",
+    lambda: get_search_cache().stats()["hit_rate"],
+)
@@ -0,0 +1,197 @@
+import json
+import os
+import sys
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+
+INDEX_DIR = ".index"
+INDEX_FILE = "paper_index.json"
+
+# In-process copy of the index, reloaded only when the index file changes
+_cache = {"path": None, "mtime": None, "index": None}
+# Serialises rebuilds and updates between threads sharing the cached index
+_lock = threading.RLock()
+
+
+def _index_path(paper_dir: str) -> str:
+    return os.path.join(paper_dir, INDEX_DIR, INDEX_FILE)
+
+
+def _read_topic_file(paper_dir: str, topic_dir: str) -> Optional[Dict]:
+    file_path = os.path.join(paper_dir, topic_dir, "papers_info.json")
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, "r") as json_file:
+        return json.load(json_file)
+
+
+def _dir_mtime(paper_dir: str) -> int:
+    return os.stat(paper_dir).st_mtime_ns
+
+
+def _save_index(paper_dir: str, index: Dict) -> None:
+    # Write to a temporary file and rename it so readers never see a partial index
+    path = _index_path(paper_dir)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as json_file:
+        json.dump(index, json_file)
+    os.replace(tmp_path, path)
+    _cache.update(path=path, mtime=os.stat(path).st_mtime_ns, index=index)
+
+
+def build_index(paper_dir: str, load_topic: Optional[Callable] = None) -> Dict:
+    """
+    Rebuild the paper-ID index by scanning every topic folder once.
+
+    Args:
+        paper_dir: Root directory holding one folder per topic
+        load_topic: Reads the papers of one topic folder, or returns None if
+            the folder holds no papers (default: read `papers_info.json`)
+
+    Returns:
+        The freshly written index
+    """
+    with _lock:
+        return _build_index(paper_dir, load_topic)
+
+
+def _build_index(paper_dir: str, load_topic: Optional[Callable]) -> Dict:
+    os.makedirs(os.path.join(paper_dir, INDEX_DIR), exist_ok=True)
+
+    load_topic = load_topic or (lambda topic_dir: _read_topic_file(paper_dir, topic_dir))
+    papers = {}
+    for item in os.listdir(paper_dir):
+        if not os.path.isdir(os.path.join(paper_dir, item)):
+            continue
+        try:
+            papers_info = load_topic(item)
+        except json.JSONDecodeError as e:
+            print(f"Error reading topic {item}: {str(e)}", file=sys.stderr)
+            continue
+        if papers_info is None:
+            continue
+        for paper_id in papers_info:
+            papers.setdefault(paper_id, item)
+
+    index = {"dir_mtime": _dir_mtime(paper_dir), "papers": papers}
+    _save_index(paper_dir, index)
+    return index
+
+
+def load_index(paper_dir: str, load_topic: Optional[Callable] = None) -> Dict:
+    """
+    Return the paper-ID index, rebuilding it if it is missing or stale.
+
+    The index is considered stale when the set of topic folders has changed
+    since it was written, which shows up as a new mtime on `paper_dir`.
+    """
+    path = _index_path(paper_dir)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return build_index(paper_dir, load_topic)
+
+    if _cache["path"] == path and _cache["mtime"] == mtime:
+        index = _cache["index"]
+    else:
+        try:
+            with open(path, "r") as json_file:
+                index = json.load(json_file)
+        except json.JSONDecodeError:
+            return build_index(paper_dir, load_topic)
+        _cache.update(path=path, mtime=mtime, index=index)
+
+    if index.get("dir_mtime") != _dir_mtime(paper_dir):
+        return build_index(paper_dir, load_topic)
+    return index
+
+
+def lookup_paper(
+    paper_dir: str, paper_id: str, load_topic: Optional[Callable] = None
+) -> Optional[Dict]:
+    """
+    Find the stored information for a paper using the paper-ID index.
+
+    Only the topic folder named by the index is read. If that folder no
+    longer holds the paper, the index is rebuilt once and the lookup retried.
+
+    Args:
+        paper_dir: Root directory holding one folder per topic
+        paper_id: The ID of the paper to look for
+        load_topic: Reads the papers of one topic folder (see `build_index`)
+
+    Returns:
+        The paper information, or None if the paper is not stored
+    """
+    if not os.path.isdir(paper_dir):
+        return None
+
+    load_topic = load_topic or (lambda topic_dir: _read_topic_file(paper_dir, topic_dir))
+    index = load_index(paper_dir, load_topic)
+    for attempt in range(2):
+        topic_dir = index["papers"].get(paper_id)
+        if topic_dir is None:
+            return None
+
+        try:
+            papers_info = load_topic(topic_dir)
+            if papers_info is not None and paper_id in papers_info:
+                return papers_info[paper_id]
+        except json.JSONDecodeError as e:
+            print(f"Error reading topic {topic_dir}: {str(e)}", file=sys.stderr)
+
+        if attempt == 0:
+            index = build_index(paper_dir, load_topic)
+    return None
+
+
+def lookup_papers(
+    paper_dir: str, paper_ids: Iterable[str], load_topic: Optional[Callable] = None
+) -> Dict[str, Optional[Dict]]:
+    """
+    Find the stored information for several papers with one index pass.
+
+    IDs are grouped by the topic folder the index names, so each folder is
+    read at most once however many of the requested papers it holds.
+
+    Args:
+        paper_dir: Root directory holding one folder per topic
+        paper_ids: The IDs of the papers to look for
+        load_topic: Reads the papers of one topic folder (see `build_index`)
+
+    Returns:
+        Paper information keyed by ID, with None for papers that are not stored
+    """
+    found = {paper_id: None for paper_id in paper_ids}
+    if not os.path.isdir(paper_dir):
+        return found
+
+    load_topic = load_topic or (lambda topic_dir: _read_topic_file(paper_dir, topic_dir))
+    index = load_index(paper_dir, load_topic)
+    pending = list(found)
+    for attempt in range(2):
+        by_topic = {}
+        for paper_id in pending:
+            topic_dir = index["papers"].get(paper_id)
+            if topic_dir is not None:
+                by_topic.setdefault(topic_dir, []).append(paper_id)
+
+        stale = []
+        for topic_dir, topic_ids in by_topic.items():
+            try:
+                papers_info = load_topic(topic_dir) or {}
+            except json.JSONDecodeError as e:
+                print(f"Error reading topic {topic_dir}: {str(e)}", file=sys.stderr)
+                papers_info = {}
+            for paper_id in topic_ids:
+                if paper_id in papers_info:
+                    found[paper_id] = papers_info[paper_id]
+                else:
+                    stale.append(paper_id)
+
+        if not stale or attempt == 1:
+            break
+        pending = stale
+        index = build_index(paper_dir, load_topic)
+    return found
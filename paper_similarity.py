@@ -0,0 +1,364 @@
+import json
+import math
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from file_lock import file_lock
+from local_search import tokenize
+from paper_storage import PaperStorage, get_storage
+
+
+# Size of the hashed term space; distinct terms sharing a bucket are merged
+HASH_DIM = 2 ** 18
+# Seconds between checks for topics written by other processes
+SIMILARITY_REFRESH = float(os.getenv("RELATED_PAPERS_REFRESH", "30"))
+SIMILARITY_DIR = "related"
+# Rebuild the search arrays once the rows appended since the last build exceed
+# this fraction of the rows they cover; until then, IDF weights stay as built
+REBUILD_FRACTION = 0.1
+
+
+def summary_vector(summary: str):
+    """Return the sorted hashed term buckets of a summary and their log-scaled counts."""
+    counts = Counter(zlib.crc32(term.encode()) % HASH_DIM for term in tokenize(summary))
+    buckets = np.array(sorted(counts), dtype=np.int32)
+    weights = np.array([1 + math.log(counts[b]) for b in buckets], dtype=np.float32)
+    return buckets, weights
+
+
+class SimilarityIndex:
+    """
+    TF-IDF vectors of the stored paper summaries, for cosine-similarity lookups.
+
+    Term-frequency rows are kept as a sparse CSR matrix in three append-only
+    files (`indptr.bin`, `indices.bin`, `data.bin`) plus the paper ID and a
+    checksum of the summary of each row in `ids.jsonl`, all memory-mapped on
+    load. Adding papers appends their rows,
+    so the stored matrix is never rewritten. Document frequencies, IDF
+    weights and row norms are derived from the mapped arrays, together with a
+    term-major copy of the matrix so a query only visits rows that share a
+    term with it. These are rebuilt once enough rows have been appended;
+    newer rows are scored directly.
+
+    A paper is vectorised the first time its ID is stored, and again when
+    its summary changes: the new row supersedes the old one, which stays in
+    the files but is no longer scored or counted in document frequencies.
+    """
+
+    def __init__(
+        self,
+        storage: PaperStorage,
+        index_dir: str,
+        refresh_seconds: float = SIMILARITY_REFRESH,
+    ):
+        self.storage = storage
+        self.index_dir = index_dir
+        self.refresh_seconds = refresh_seconds
+        self._topic_versions = {}
+        self._checked_at = None
+        self._lock = threading.RLock()
+        self._reset()
+        os.makedirs(index_dir, exist_ok=True)
+        with self._file_lock():
+            self._catch_up()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.index_dir, name)
+
+    def _file_lock(self):
+        # Appends and tail repairs are serialised across processes
+        return file_lock(self._path(".lock"))
+
+    def _map(self, name: str, dtype, count: int) -> np.ndarray:
+        if count == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(self._path(name), dtype=dtype, mode="r", shape=(count,))
+
+    def _catch_up(self) -> None:
+        """Read the rows other processes appended since the last call; hold the file lock."""
+        def file_count(name: str, itemsize: int) -> int:
+            try:
+                return os.path.getsize(self._path(name)) // itemsize
+            except FileNotFoundError:
+                return 0
+
+        if file_count("ids.jsonl", 1) < self._ids_size:
+            # The index was removed or replaced under us; start over
+            self._reset()
+
+        # Appends write the matrix before the IDs, so trust only complete ID
+        # lines that have a row
+        max_rows = max(file_count("indptr.bin", 8) - 1, 0)
+        ids, checksums, size = [], [], 0
+        try:
+            with open(self._path("ids.jsonl"), "rb") as ids_file:
+                ids_file.seek(self._ids_size)
+                for line in ids_file:
+                    if len(self.ids) + len(ids) == max_rows or not line.endswith(b"\n"):
+                        break
+                    try:
+                        paper_id, checksum = json.loads(line)
+                    except (ValueError, TypeError):
+                        break
+                    ids.append(paper_id)
+                    checksums.append(checksum)
+                    size += len(line)
+        except FileNotFoundError:
+            pass
+        if ids:
+            self._extend(ids, checksums, size)
+
+        # Drop a torn tail so the next append lines up with the trusted rows
+        rows, nnz = len(self.ids), int(self.indptr[-1])
+        for name, itemsize, count in (
+            ("ids.jsonl", 1, self._ids_size),
+            ("indptr.bin", 8, rows + 1 if rows else 0),
+            ("indices.bin", 4, nnz),
+            ("data.bin", 4, nnz),
+        ):
+            if file_count(name, itemsize) > count:
+                with open(self._path(name), "r+b") as f:
+                    f.truncate(count * itemsize)
+
+    def _reset(self) -> None:
+        self.ids = []
+        self.checksums = []
+        self.rows = {}
+        self.live = np.zeros(0, dtype=bool)
+        self.indptr = np.zeros(1, np.int64)
+        self.indices = np.zeros(0, np.int32)
+        self.data = np.zeros(0, np.float32)
+        # Bytes of ids.jsonl already read
+        self._ids_size = 0
+        # Search arrays for a prefix of the rows; the matrix is append-only,
+        # so they stay valid as papers are added
+        self._base = None
+        self._delta = None
+
+    def _extend(self, ids: List[str], checksums: List[int], size: int) -> None:
+        """Take in rows just appended to the files, whose `ids.jsonl` lines take `size` bytes."""
+        start = len(self.ids)
+        self.ids.extend(ids)
+        self.checksums.extend(checksums)
+        self._ids_size += size
+        rows = len(self.ids)
+        self.indptr = self._map("indptr.bin", np.int64, rows + 1)
+        nnz = int(self.indptr[-1])
+        self.indices = self._map("indices.bin", np.int32, nnz)
+        self.data = self._map("data.bin", np.float32, nnz)
+
+        # A paper's latest row supersedes the ones before it
+        live = np.ones(rows, dtype=bool)
+        live[:start] = self.live
+        for row, paper_id in enumerate(ids, start):
+            superseded = self.rows.get(paper_id)
+            if superseded is not None:
+                live[superseded] = False
+            self.rows[paper_id] = row
+        self.live = live
+
+        # Rows appended since the base was built are scored separately
+        self._delta = None
+
+    def add_papers(self, papers: Dict[str, Dict]) -> int:
+        """
+        Append the TF rows of papers that are not indexed yet or whose summary changed.
+
+        Returns:
+            The number of papers added
+        """
+        with self._lock, self._file_lock():
+            # Catch up with rows other processes appended, so offsets line up
+            self._catch_up()
+            new = []
+            for paper_id, paper_info in papers.items():
+                summary = paper_info.get("summary", "")
+                checksum = zlib.crc32(summary.encode())
+                row = self.rows.get(paper_id)
+                if row is None or self.checksums[row] != checksum:
+                    new.append((paper_id, summary, checksum))
+            if not new:
+                return 0
+
+            offset = int(self.indptr[-1])
+            indptr, indices, data = [], [], []
+            for paper_id, summary, checksum in new:
+                buckets, weights = summary_vector(summary)
+                indices.append(buckets)
+                data.append(weights)
+                offset += len(buckets)
+                indptr.append(offset)
+
+            with open(self._path("indices.bin"), "ab") as f:
+                f.write(np.concatenate(indices).astype(np.int32).tobytes())
+            with open(self._path("data.bin"), "ab") as f:
+                f.write(np.concatenate(data).astype(np.float32).tobytes())
+            with open(self._path("indptr.bin"), "ab") as f:
+                if not self.ids:
+                    f.write(np.zeros(1, np.int64).tobytes())
+                f.write(np.array(indptr, dtype=np.int64).tobytes())
+            lines = "".join(json.dumps([paper_id, checksum]) + "\n" for paper_id, _, checksum in new).encode()
+            with open(self._path("ids.jsonl"), "ab") as f:
+                f.write(lines)
+
+            self._extend([paper_id for paper_id, _, _ in new], [checksum for _, _, checksum in new], len(lines))
+            return len(new)
+
+    def refresh(self, force: bool = False) -> None:
+        """Vectorise papers from topics whose storage version changed since the last check."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked_at is not None and now - self._checked_at < self.refresh_seconds:
+                return
+            self._checked_at = now
+
+            # One append for all changed topics, so the files are mapped once
+            papers, versions = {}, {}
+            for topic_dir in self.storage.list_topics():
+                version = self.storage.topic_version(topic_dir)
+                if self._topic_versions.get(topic_dir) == version:
+                    continue
+                try:
+                    papers.update(self.storage.get_topic_papers(topic_dir) or {})
+                except json.JSONDecodeError as e:
+                    print(f"Error reading topic {topic_dir}: {str(e)}", file=sys.stderr)
+                    continue
+                versions[topic_dir] = version
+            if papers:
+                self.add_papers(papers)
+            self._topic_versions.update(versions)
+
+    def _build_base(self, rows: int) -> Dict:
+        nnz = int(self.indptr[rows])
+        indices = np.asarray(self.indices[:nnz])
+        row_of = np.repeat(np.arange(rows, dtype=np.int32), np.diff(self.indptr[:rows + 1]))
+        # Superseded rows do not count towards document frequencies
+        live = self.live[:rows]
+        df = np.bincount(indices[live[row_of]], minlength=HASH_DIM)
+        idf = (np.log((1 + live.sum()) / (1 + df)) + 1).astype(np.float32)
+        weighted = self.data[:nnz] * idf[indices]
+        norms = np.sqrt(np.bincount(row_of, weights=weighted ** 2, minlength=rows))
+
+        # Term-major copy, so a query only touches the rows sharing its terms
+        order = np.argsort(indices, kind="stable")
+        return {
+            "rows": rows,
+            "nnz": nnz,
+            "idf": idf,
+            "norms": norms,
+            "col_ptr": np.concatenate(([0], np.cumsum(np.bincount(indices, minlength=HASH_DIM)))),
+            "col_rows": row_of[order],
+            "col_vals": weighted[order],
+        }
+
+    def _build_delta(self, base: Dict) -> Dict:
+        indices = np.asarray(self.indices[base["nnz"]:])
+        weighted = self.data[base["nnz"]:] * base["idf"][indices]
+        rows = len(self.ids) - base["rows"]
+        row_of = np.repeat(np.arange(rows, dtype=np.int32), np.diff(self.indptr[base["rows"]:]))
+        return {
+            "indices": indices,
+            "weighted": weighted,
+            "row_of": row_of,
+            "norms": np.sqrt(np.bincount(row_of, weights=weighted ** 2, minlength=rows)),
+        }
+
+    def _prepare(self) -> None:
+        total = len(self.ids)
+        if self._base is None or total - self._base["rows"] > REBUILD_FRACTION * self._base["rows"]:
+            self._base = self._build_base(total)
+            self._delta = None
+        if self._delta is None:
+            self._delta = self._build_delta(self._base)
+
+    def related(self, paper_id: str, k: int = 5) -> Optional[List[Dict]]:
+        """
+        Find the stored papers whose summaries are most similar to a paper's.
+
+        Args:
+            paper_id: The ID of a stored paper
+            k: Number of papers to return
+
+        Returns:
+            [{"paper_id", "score"}] with the highest cosine similarity first,
+            or None if the paper is not indexed
+        """
+        if paper_id not in self.rows:
+            self.refresh(force=True)
+        else:
+            self.refresh()
+
+        with self._lock:
+            row = self.rows.get(paper_id)
+            if row is None:
+                return None
+            self._prepare()
+            base, delta = self._base, self._delta
+
+            start, end = self.indptr[row], self.indptr[row + 1]
+            buckets = np.asarray(self.indices[start:end])
+            weights = self.data[start:end] * base["idf"][buckets]
+            query_norm = np.sqrt(np.sum(weights ** 2))
+            if query_norm == 0:
+                return []
+
+            # Rows in the base: walk the posting lists of the query's terms
+            col_start = base["col_ptr"][buckets]
+            lengths = base["col_ptr"][buckets + 1] - col_start
+            positions = (
+                np.repeat(col_start - (np.cumsum(lengths) - lengths), lengths)
+                + np.arange(lengths.sum())
+            )
+            base_scores = np.bincount(
+                base["col_rows"][positions],
+                weights=base["col_vals"][positions] * np.repeat(weights, lengths),
+                minlength=base["rows"],
+            )
+
+            # Rows appended since the base was built: score them directly
+            query = np.zeros(HASH_DIM, dtype=np.float32)
+            query[buckets] = weights
+            delta_scores = np.bincount(
+                delta["row_of"],
+                weights=delta["weighted"] * query[delta["indices"]],
+                minlength=len(self.ids) - base["rows"],
+            )
+
+            with np.errstate(divide="ignore", invalid="ignore"):
+                scores = np.nan_to_num(np.concatenate((
+                    base_scores / base["norms"],
+                    delta_scores / delta["norms"],
+                )) / query_norm)
+            scores[row] = -1.0
+            scores[~self.live] = -1.0
+
+            k = min(k, len(self.ids) - 1)
+            if k <= 0:
+                return []
+            best = np.argpartition(-scores, k - 1)[:k]
+            best = best[np.argsort(-scores[best])]
+            return [
+                {"paper_id": self.ids[i], "score": round(float(scores[i]), 4)}
+                for i in best if scores[i] > 0
+            ]
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_similarity_index(paper_dir: str) -> SimilarityIndex:
+    """Return the process-wide similarity index, stored under `paper_dir`/.index/related."""
+    with _indexes_lock:
+        if paper_dir not in _indexes:
+            _indexes[paper_dir] = SimilarityIndex(
+                get_storage(paper_dir), os.path.join(paper_dir, ".index", SIMILARITY_DIR)
+            )
+        return _indexes[paper_dir]
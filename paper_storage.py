@@ -0,0 +1,1163 @@
+import argparse
+import contextlib
+import json
+import mmap
+import os
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from typing import Dict, List, Optional
+
+from file_lock import file_lock
+from paper_index import lookup_paper, lookup_papers
+
+
+PAPER_DIR = "papers"
+DB_FILE = "papers.db"
+SNAPSHOT_FILE = "papers_info.json"
+LOG_FILE = "papers_log.jsonl"
+IDS_FILE = "paper_ids.json"
+IDS_LOG_FILE = "paper_ids_log.jsonl"
+# Snapshot and log names of full records and of topic ID lists
+RECORD_FILES = (SNAPSHOT_FILE, LOG_FILE)
+ID_FILES = (IDS_FILE, IDS_LOG_FILE)
+# Shared record store of the JSON backend, split into RECORD_SHARDS folders
+RECORDS_DIR = ".records"
+RECORD_SHARDS = 256
+# Number of logged records after which a topic's log is compacted
+COMPACT_AFTER = 100
+# Folder of the binary backend, its record fields in stored order and the
+# size from which a field is compressed
+BINARY_DIR = ".binary"
+BINARY_FIELDS = ("title", "authors", "summary", "pdf_url", "published")
+COMPRESS_MIN = 128
+# Index entry: record offset, one length per field, bit mask of compressed fields
+INDEX_ENTRY = struct.Struct(f"<Q{len(BINARY_FIELDS)}IB")
+
+
+class PaperStorage:
+    """
+    Interface shared by the paper storage backends.
+
+    Papers are dictionaries with the fields written by `search_papers`:
+    title, authors, summary, pdf_url and published.
+    """
+
+    def add_papers(self, topic_dir: str, papers: Dict[str, Dict]) -> str:
+        """Store papers under a topic and return a description of where they went."""
+        raise NotImplementedError
+
+    def get_paper(self, paper_id: str) -> Optional[Dict]:
+        """Return the information for a paper, or None if it is not stored."""
+        raise NotImplementedError
+
+    def get_papers(self, paper_ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Optional[Dict]]:
+        """
+        Return the information for several papers, with None for unknown IDs.
+
+        With `fields`, only those fields are needed; backends that can read
+        fields separately return just them, the others return every field.
+        """
+        return {paper_id: self.get_paper(paper_id) for paper_id in paper_ids}
+
+    def get_topic_papers(self, topic_dir: str) -> Optional[Dict[str, Dict]]:
+        """Return the papers stored under a topic, or None if the topic is unknown."""
+        raise NotImplementedError
+
+    def topic_paper_ids(self, topic_dir: str) -> Optional[List[str]]:
+        """Return the IDs of a topic's papers in stored order, or None if the topic is unknown."""
+        papers = self.get_topic_papers(topic_dir)
+        return list(papers) if papers is not None else None
+
+    def list_topics(self) -> List[str]:
+        """Return the names of all topics that have stored papers."""
+        raise NotImplementedError
+
+    def topic_version(self, topic_dir: str) -> Optional[tuple]:
+        """Return a value that changes whenever a topic's papers change, or None if unknown."""
+        raise NotImplementedError
+
+    def topic_stats(self, topic_dirs: Optional[List[str]] = None) -> Dict[str, Dict]:
+        """
+        Return the paper count and last update time of topics.
+
+        Args:
+            topic_dirs: Topics to describe (default: every topic)
+
+        Returns:
+            {"papers": count, "updated": POSIX timestamp} keyed by topic, for
+            the requested topics that exist
+        """
+        raise NotImplementedError
+
+    def papers_by_author(self, author: str) -> Dict[str, Dict]:
+        """Return all stored papers with the given author."""
+        raise NotImplementedError
+
+    def papers_published_between(self, start: str, end: str) -> Dict[str, Dict]:
+        """Return all stored papers published between two ISO dates, inclusive."""
+        raise NotImplementedError
+
+    @contextlib.contextmanager
+    def bulk_load(self):
+        """Group many `add_papers` calls; backends may defer upkeep until the block ends."""
+        yield self
+
+
+class JsonStorage(PaperStorage):
+    """
+    Stores paper records once in a shared record store and topics as ID lists.
+
+    Records live under `.records/<shard>/`, where the shard is derived from
+    the paper ID, and each topic folder only lists the IDs of its papers in
+    `paper_ids.json`. A paper found under several topics is therefore stored
+    once, and `get_paper` reads it straight from its shard.
+
+    Every shard and topic list is a JSON snapshot plus a log: new or changed
+    entries are appended to the log, one per line, so a write only costs as
+    much as the papers it adds. Once a log holds `compact_after` entries it
+    is folded into a new snapshot, which is written to a temporary file and
+    renamed into place so a crash never leaves a partial snapshot.
+
+    Writes to a snapshot-and-log pair hold an flock on a lock file beside
+    it and re-read the pair first, so several processes can write to the
+    same topic without losing each other's papers.
+
+    Topic folders written before records were shared still hold full records
+    in `papers_info.json`. They are read as before and moved to the record
+    store the next time papers are added to them, or by `dedup_topics`.
+    """
+
+    def __init__(self, paper_dir: str = PAPER_DIR, compact_after: int = COMPACT_AFTER):
+        self.paper_dir = paper_dir
+        self.compact_after = compact_after
+        # Shard and topic contents keyed by the snapshot mtime and log size they were read at
+        self._maps = {}
+        # (paper_dir mtime, topics still holding full records) as last listed
+        self._legacy = None
+        # Inside bulk_load: the snapshot-and-log pairs appended to, else None
+        self._bulk = None
+        # Writers run in worker threads, so serialise appends and compactions
+        self._write_lock = threading.RLock()
+
+    def _paths(self, rel_dir: str, files: tuple) -> tuple:
+        return tuple(os.path.join(self.paper_dir, rel_dir, name) for name in files)
+
+    def _topic_file(self, topic_dir: str) -> str:
+        return self._paths(topic_dir, ID_FILES)[0]
+
+    def _shard_dir(self, paper_id: str) -> str:
+        return os.path.join(RECORDS_DIR, f"{zlib.crc32(paper_id.encode()) % RECORD_SHARDS:02x}")
+
+    def _stat_key(self, rel_dir: str, files: tuple = ID_FILES) -> Optional[tuple]:
+        snapshot_path, log_path = self._paths(rel_dir, files)
+        try:
+            snapshot_mtime = os.stat(snapshot_path).st_mtime_ns
+        except FileNotFoundError:
+            snapshot_mtime = None
+        try:
+            log_size = os.stat(log_path).st_size
+        except FileNotFoundError:
+            log_size = None
+        if snapshot_mtime is None and log_size is None:
+            return None
+        return (snapshot_mtime, log_size)
+
+    def _read_map(self, rel_dir: str, files: tuple) -> Optional[Dict]:
+        """Read a snapshot and its log; ID lists come back as {paper_id: None}."""
+        cache_key = (rel_dir, files)
+        key = self._stat_key(rel_dir, files)
+        if key is None:
+            self._maps.pop(cache_key, None)
+            return None
+
+        state = self._maps.get(cache_key)
+        if state is not None and state["key"] == key:
+            return state["entries"]
+
+        # Another process may compact or convert the files while they are
+        # read; a vanished file is skipped and the new state read next time
+        snapshot_path, log_path = self._paths(rel_dir, files)
+        entries = {}
+        if key[0] is not None:
+            try:
+                with open(snapshot_path, "r") as json_file:
+                    snapshot = json.load(json_file)
+                entries = dict.fromkeys(snapshot) if isinstance(snapshot, list) else snapshot
+            except FileNotFoundError:
+                pass
+
+        log_records = 0
+        clean_tail = True
+        if key[1] is not None:
+            try:
+                with open(log_path, "r") as log_file:
+                    for line in log_file:
+                        clean_tail = line.endswith("\n")
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            # A torn final line left by a crash mid-append
+                            continue
+                        entries[record["id"]] = record.get("paper")
+                        log_records += 1
+            except FileNotFoundError:
+                pass
+
+        self._maps[cache_key] = {
+            "key": key,
+            "entries": entries,
+            "log_records": log_records,
+            "clean_tail": clean_tail,
+        }
+        return entries
+
+    def _append(self, rel_dir: str, files: tuple, entries: Dict) -> None:
+        state = self._maps[(rel_dir, files)]
+        with open(self._paths(rel_dir, files)[1], "a") as log_file:
+            if not state["clean_tail"]:
+                log_file.write("\n")
+            log_file.write("".join(
+                json.dumps({"id": paper_id} if files == ID_FILES else {"id": paper_id, "paper": value}) + "\n"
+                for paper_id, value in entries.items()
+            ))
+            log_file.flush()
+            os.fsync(log_file.fileno())
+
+        # Readers in other threads may be iterating the dict they were given,
+        # so swap in a new one rather than changing it
+        state["entries"] = {**state["entries"], **entries}
+        state["log_records"] += len(entries)
+        state["clean_tail"] = True
+        state["key"] = self._stat_key(rel_dir, files)
+
+    def _write_snapshot(self, rel_dir: str, files: tuple, entries: Dict) -> None:
+        snapshot_path, log_path = self._paths(rel_dir, files)
+        os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+        tmp_path = f"{snapshot_path}.tmp"
+        with open(tmp_path, "w") as json_file:
+            json.dump(list(entries) if files == ID_FILES else entries, json_file, indent=2)
+            json_file.flush()
+            os.fsync(json_file.fileno())
+        os.replace(tmp_path, snapshot_path)
+        try:
+            os.remove(log_path)
+        except FileNotFoundError:
+            pass
+
+        self._maps[(rel_dir, files)] = {
+            "key": self._stat_key(rel_dir, files),
+            "entries": entries,
+            "log_records": 0,
+            "clean_tail": True,
+        }
+
+    def _locked(self, rel_dir: str, files: tuple):
+        # One lock file per snapshot-and-log pair, shared by every process
+        return file_lock(os.path.join(self.paper_dir, rel_dir, f".{files[0]}.lock"))
+
+    def _append_unread(self, rel_dir: str, files: tuple, entries: Dict) -> None:
+        """Append entries without reading the pair, for bulk loads; see `bulk_load`."""
+        log_path = self._paths(rel_dir, files)[1]
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        with open(log_path, "a+b") as log_file:
+            # Start on a new line if a crash left the last one torn
+            torn = False
+            if log_file.tell():
+                log_file.seek(-1, os.SEEK_END)
+                torn = log_file.read(1) != b"\n"
+            log_file.write((("\n" if torn else "") + "".join(
+                json.dumps({"id": paper_id} if files == ID_FILES else {"id": paper_id, "paper": value}) + "\n"
+                for paper_id, value in entries.items()
+            )).encode())
+            log_file.flush()
+            os.fsync(log_file.fileno())
+        self._maps.pop((rel_dir, files), None)
+        self._bulk.add((rel_dir, files))
+
+    def _merge(self, rel_dir: str, files: tuple, entries: Dict) -> str:
+        """Add or replace entries of one snapshot-and-log pair; return the file written."""
+        if self._bulk is not None:
+            with self._locked(rel_dir, files):
+                self._append_unread(rel_dir, files, entries)
+            return self._paths(rel_dir, files)[1]
+
+        # Re-read under the lock, so entries appended by another process are
+        # kept and the comparison below sees them
+        with self._locked(rel_dir, files):
+            try:
+                current = self._read_map(rel_dir, files)
+            except json.JSONDecodeError as e:
+                print(f"Error reading {rel_dir}, starting a new snapshot: {str(e)}", file=sys.stderr)
+                current = None
+
+            if current is None:
+                self._write_snapshot(rel_dir, files, entries)
+                return self._paths(rel_dir, files)[0]
+
+            changed = {
+                paper_id: value for paper_id, value in entries.items()
+                if paper_id not in current or current[paper_id] != value
+            }
+            if changed:
+                self._append(rel_dir, files, changed)
+            state = self._maps[(rel_dir, files)]
+            if state["log_records"] >= self.compact_after:
+                # `_append` swapped in a new dict, so take the entries from
+                # the state rather than `current`, which lacks the new ones
+                self._write_snapshot(rel_dir, files, dict(state["entries"]))
+            return self._paths(rel_dir, files)[1]
+
+    def _store_records(self, papers: Dict[str, Dict]) -> None:
+        by_shard = {}
+        for paper_id, paper_info in papers.items():
+            by_shard.setdefault(self._shard_dir(paper_id), {})[paper_id] = paper_info
+        for shard_dir, shard_papers in by_shard.items():
+            self._merge(shard_dir, RECORD_FILES, shard_papers)
+
+    def _read_records(self, paper_ids) -> Dict[str, Dict]:
+        by_shard = {}
+        for paper_id in paper_ids:
+            by_shard.setdefault(self._shard_dir(paper_id), []).append(paper_id)
+        found = {}
+        for shard_dir, shard_ids in by_shard.items():
+            records = self._read_map(shard_dir, RECORD_FILES) or {}
+            for paper_id in shard_ids:
+                if paper_id in records:
+                    found[paper_id] = records[paper_id]
+        return found
+
+    def _read_topic(self, topic_dir: str) -> Optional[Dict]:
+        paper_ids = self._read_map(topic_dir, ID_FILES)
+        if paper_ids is None:
+            # Topic folders written before records were shared hold full records
+            return self._read_map(topic_dir, RECORD_FILES)
+
+        records = self._read_records(paper_ids)
+        return {paper_id: records[paper_id] for paper_id in paper_ids if paper_id in records}
+
+    def _read_legacy_topic(self, topic_dir: str) -> Optional[Dict]:
+        return self._read_map(topic_dir, RECORD_FILES)
+
+    def _is_legacy(self, topic_dir: str) -> bool:
+        return (
+            self._stat_key(topic_dir, ID_FILES) is None
+            and self._stat_key(topic_dir, RECORD_FILES) is not None
+        )
+
+    def _legacy_topics(self) -> List[str]:
+        # Every lookup miss asks, and listing thousands of topic folders is
+        # slow. A full-record folder can only appear as a new folder, which
+        # changes the mtime of paper_dir, so only then list them again;
+        # otherwise just drop the ones converted since
+        try:
+            dir_mtime = os.stat(self.paper_dir).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        legacy = self._legacy
+        if legacy is None or legacy[0] != dir_mtime:
+            topic_dirs = [topic_dir for topic_dir in self.list_topics() if self._is_legacy(topic_dir)]
+        else:
+            topic_dirs = [topic_dir for topic_dir in legacy[1] if self._is_legacy(topic_dir)]
+        self._legacy = (dir_mtime, topic_dirs)
+        return topic_dirs
+
+    def _migrate_topic(self, topic_dir: str) -> int:
+        """Move a full-record topic folder into the record store; return its paper count."""
+        with self._locked(topic_dir, RECORD_FILES):
+            papers = self._read_legacy_topic(topic_dir)
+            if papers is None:
+                return 0
+            self._store_records(papers)
+            self._merge(topic_dir, ID_FILES, dict.fromkeys(papers))
+            for path in self._paths(topic_dir, RECORD_FILES):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            self._maps.pop((topic_dir, RECORD_FILES), None)
+            return len(papers)
+
+    def add_papers(self, topic_dir: str, papers: Dict[str, Dict]) -> str:
+        with self._write_lock:
+            return self._add_papers(topic_dir, papers)
+
+    def _add_papers(self, topic_dir: str, papers: Dict[str, Dict]) -> str:
+        os.makedirs(os.path.join(self.paper_dir, topic_dir), exist_ok=True)
+
+        if self._is_legacy(topic_dir):
+            try:
+                self._migrate_topic(topic_dir)
+            except json.JSONDecodeError as e:
+                # Leave the unreadable file in place and start a new ID list beside it
+                print(f"Error reading topic {topic_dir}: {str(e)}", file=sys.stderr)
+
+        # Records first, so a topic never lists a paper the store does not hold
+        self._store_records(papers)
+        return self._merge(topic_dir, ID_FILES, dict.fromkeys(papers))
+
+    def compact(self, topic_dir: str) -> None:
+        """
+        Fold the topic's ID log into a new snapshot and remove the log.
+
+        The snapshot is replaced atomically, and replaying a log that was not
+        removed because of a crash is harmless since its entries are already
+        in the snapshot.
+        """
+        with self._write_lock, self._locked(topic_dir, ID_FILES):
+            paper_ids = self._read_map(topic_dir, ID_FILES)
+            if paper_ids is not None:
+                self._write_snapshot(topic_dir, ID_FILES, dict(paper_ids))
+
+    @contextlib.contextmanager
+    def bulk_load(self):
+        """
+        Append papers without reading what is stored, then compact once.
+
+        Inside the block, `add_papers` appends to the logs without reading
+        or caching the snapshots, so memory stays flat however many papers
+        are loaded, and no snapshot is rewritten every `compact_after`
+        entries. Papers stored again are simply logged again. On exit each
+        log appended to is folded into its snapshot, one pair at a time.
+        """
+        with self._write_lock:
+            self._bulk = set()
+        try:
+            yield self
+        finally:
+            with self._write_lock:
+                appended, self._bulk = self._bulk, None
+                for rel_dir, files in sorted(appended):
+                    with self._locked(rel_dir, files):
+                        entries = self._read_map(rel_dir, files)
+                        if entries is not None:
+                            self._write_snapshot(rel_dir, files, dict(entries))
+                        self._maps.pop((rel_dir, files), None)
+
+    def dedup_topics(self) -> int:
+        """
+        Move every full-record topic folder into the shared record store.
+
+        Returns:
+            Number of topic folders converted
+        """
+        migrated = 0
+        with self._write_lock:
+            for topic_dir in self._legacy_topics():
+                try:
+                    count = self._migrate_topic(topic_dir)
+                except json.JSONDecodeError as e:
+                    print(f"Skipping {topic_dir}: {str(e)}", file=sys.stderr)
+                    continue
+                migrated += 1
+                print(f"Moved {count} papers from {topic_dir} to the record store", file=sys.stderr)
+        return migrated
+
+    def get_paper(self, paper_id: str) -> Optional[Dict]:
+        paper_info = self._read_records([paper_id]).get(paper_id)
+        if paper_info is None and self._legacy_topics():
+            return lookup_paper(self.paper_dir, paper_id, self._read_legacy_topic)
+        return paper_info
+
+    def get_papers(self, paper_ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Optional[Dict]]:
+        found = dict.fromkeys(paper_ids)
+        found.update(self._read_records(found))
+        missing = [paper_id for paper_id, paper_info in found.items() if paper_info is None]
+        if missing and self._legacy_topics():
+            found.update(lookup_papers(self.paper_dir, missing, self._read_legacy_topic))
+        return found
+
+    def get_topic_papers(self, topic_dir: str) -> Optional[Dict[str, Dict]]:
+        return self._read_topic(topic_dir)
+
+    def topic_paper_ids(self, topic_dir: str) -> Optional[List[str]]:
+        paper_ids = self._read_map(topic_dir, ID_FILES)
+        if paper_ids is None:
+            return super().topic_paper_ids(topic_dir)
+        return list(paper_ids)
+
+    def topic_version(self, topic_dir: str) -> Optional[tuple]:
+        key = self._stat_key(topic_dir, ID_FILES)
+        if key is None:
+            return self._stat_key(topic_dir, RECORD_FILES)
+
+        # A shared record can change through another topic, so include the
+        # state of every shard this topic's papers live in
+        try:
+            paper_ids = self._read_map(topic_dir, ID_FILES) or {}
+        except json.JSONDecodeError:
+            return key
+        shards = sorted({self._shard_dir(paper_id) for paper_id in paper_ids})
+        return (key, tuple(self._stat_key(shard_dir, RECORD_FILES) for shard_dir in shards))
+
+    def topic_stats(self, topic_dirs: Optional[List[str]] = None) -> Dict[str, Dict]:
+        stats = {}
+        for topic_dir in self.list_topics() if topic_dirs is None else topic_dirs:
+            files = ID_FILES if self._stat_key(topic_dir, ID_FILES) is not None else RECORD_FILES
+            try:
+                entries = self._read_map(topic_dir, files)
+            except json.JSONDecodeError as e:
+                print(f"Error reading topic {topic_dir}: {str(e)}", file=sys.stderr)
+                continue
+            if entries is None:
+                continue
+            mtimes = []
+            for path in self._paths(topic_dir, files):
+                try:
+                    mtimes.append(os.stat(path).st_mtime)
+                except FileNotFoundError:
+                    pass
+            stats[topic_dir] = {"papers": len(entries), "updated": max(mtimes, default=0.0)}
+        return stats
+
+    def list_topics(self) -> List[str]:
+        if not os.path.exists(self.paper_dir):
+            return []
+        return [
+            topic_dir for topic_dir in os.listdir(self.paper_dir)
+            if topic_dir != RECORDS_DIR and any(
+                os.path.exists(path)
+                for files in (ID_FILES, RECORD_FILES)
+                for path in self._paths(topic_dir, files)
+            )
+        ]
+
+    def _all_papers(self) -> Dict[str, Dict]:
+        papers = {}
+        for topic_dir in self.list_topics():
+            try:
+                for paper_id, paper_info in self.get_topic_papers(topic_dir).items():
+                    papers.setdefault(paper_id, paper_info)
+            except json.JSONDecodeError as e:
+                print(f"Error reading topic {topic_dir}: {str(e)}", file=sys.stderr)
+        return papers
+
+    def papers_by_author(self, author: str) -> Dict[str, Dict]:
+        return {
+            paper_id: paper_info for paper_id, paper_info in self._all_papers().items()
+            if author in paper_info["authors"]
+        }
+
+    def papers_published_between(self, start: str, end: str) -> Dict[str, Dict]:
+        return {
+            paper_id: paper_info for paper_id, paper_info in self._all_papers().items()
+            if start <= paper_info["published"] <= end
+        }
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    summary TEXT NOT NULL,
+    pdf_url TEXT,
+    published TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS papers_published ON papers (published);
+
+CREATE TABLE IF NOT EXISTS authors (
+    paper_id TEXT NOT NULL REFERENCES papers (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    PRIMARY KEY (paper_id, position)
+);
+CREATE INDEX IF NOT EXISTS authors_name ON authors (name);
+
+CREATE TABLE IF NOT EXISTS topic_papers (
+    topic TEXT NOT NULL,
+    paper_id TEXT NOT NULL REFERENCES papers (id) ON DELETE CASCADE,
+    PRIMARY KEY (topic, paper_id)
+);
+CREATE INDEX IF NOT EXISTS topic_papers_paper ON topic_papers (paper_id);
+
+CREATE TABLE IF NOT EXISTS topic_versions (
+    topic TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    updated_at REAL
+);
+"""
+
+
+class SqliteStorage(PaperStorage):
+    """
+    Stores papers, authors and topic membership in one SQLite database.
+
+    The database runs in WAL mode so readers never block the writer. Each
+    thread gets its own connection.
+    """
+
+    def __init__(self, db_path: str = os.path.join(PAPER_DIR, DB_FILE)):
+        self.db_path = db_path
+        self._local = threading.local()
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        conn = self._connection()
+        conn.executescript(SCHEMA)
+        try:
+            # Databases created before updated_at was tracked
+            conn.execute("ALTER TABLE topic_versions ADD COLUMN updated_at REAL")
+        except sqlite3.OperationalError:
+            pass
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def add_papers(self, topic_dir: str, papers: Dict[str, Dict]) -> str:
+        conn = self._connection()
+        with conn:
+            # Rewriting papers that are already stored as given would bump
+            # topic versions and throw away rendered pages for nothing
+            stored = self.get_papers(list(papers))
+            changed = {
+                paper_id: info for paper_id, info in papers.items() if stored[paper_id] != info
+            }
+            conn.executemany(
+                """
+                INSERT INTO papers (id, title, summary, pdf_url, published)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (id) DO UPDATE SET
+                    title = excluded.title,
+                    summary = excluded.summary,
+                    pdf_url = excluded.pdf_url,
+                    published = excluded.published
+                """,
+                [
+                    (paper_id, info["title"], info["summary"], info["pdf_url"], info["published"])
+                    for paper_id, info in changed.items()
+                ],
+            )
+            conn.executemany(
+                "DELETE FROM authors WHERE paper_id = ?",
+                [(paper_id,) for paper_id in changed],
+            )
+            conn.executemany(
+                "INSERT INTO authors (paper_id, position, name) VALUES (?, ?, ?)",
+                [
+                    (paper_id, position, name)
+                    for paper_id, info in changed.items()
+                    for position, name in enumerate(info["authors"])
+                ],
+            )
+            added = conn.executemany(
+                "INSERT OR IGNORE INTO topic_papers (topic, paper_id) VALUES (?, ?)",
+                [(topic_dir, paper_id) for paper_id in papers],
+            ).rowcount
+
+            # A changed paper also changes every other topic that lists it
+            touched = {topic_dir} if added > 0 else set()
+            if changed:
+                placeholders = ", ".join("?" * len(changed))
+                touched.update(
+                    row["topic"] for row in conn.execute(
+                        f"SELECT DISTINCT topic FROM topic_papers WHERE paper_id IN ({placeholders})",
+                        tuple(changed),
+                    )
+                )
+            now = time.time()
+            conn.executemany(
+                "INSERT INTO topic_versions (topic, version, updated_at) VALUES (?, 1, ?) "
+                "ON CONFLICT (topic) DO UPDATE SET "
+                "version = version + 1, updated_at = excluded.updated_at",
+                [(topic, now) for topic in sorted(touched)],
+            )
+        return f"{self.db_path} (topic {topic_dir})"
+
+    def _load(
+        self, where: str, params: tuple, join: str = "", order: str = "papers.rowid"
+    ) -> Dict[str, Dict]:
+        conn = self._connection()
+        rows = conn.execute(
+            f"SELECT papers.* FROM papers {join} WHERE {where} ORDER BY {order}",
+            params,
+        ).fetchall()
+        papers = {
+            row["id"]: {
+                "title": row["title"],
+                "authors": [],
+                "summary": row["summary"],
+                "pdf_url": row["pdf_url"],
+                "published": row["published"],
+            }
+            for row in rows
+        }
+        if papers:
+            placeholders = ", ".join("?" * len(papers))
+            for row in conn.execute(
+                f"SELECT paper_id, name FROM authors WHERE paper_id IN ({placeholders}) "
+                "ORDER BY paper_id, position",
+                tuple(papers),
+            ):
+                papers[row["paper_id"]]["authors"].append(row["name"])
+        return papers
+
+    def get_paper(self, paper_id: str) -> Optional[Dict]:
+        return self._load("papers.id = ?", (paper_id,)).get(paper_id)
+
+    def get_papers(self, paper_ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Optional[Dict]]:
+        found = dict.fromkeys(paper_ids)
+        if found:
+            placeholders = ", ".join("?" * len(found))
+            found.update(self._load(f"papers.id IN ({placeholders})", tuple(found)))
+        return found
+
+    def get_topic_papers(self, topic_dir: str) -> Optional[Dict[str, Dict]]:
+        papers = self._load(
+            "topic_papers.topic = ?",
+            (topic_dir,),
+            join="JOIN topic_papers ON topic_papers.paper_id = papers.id",
+            order="topic_papers.rowid",
+        )
+        return papers or None
+
+    def topic_paper_ids(self, topic_dir: str) -> Optional[List[str]]:
+        rows = self._connection().execute(
+            "SELECT paper_id FROM topic_papers WHERE topic = ? ORDER BY rowid", (topic_dir,)
+        ).fetchall()
+        return [row["paper_id"] for row in rows] or None
+
+    def topic_version(self, topic_dir: str) -> Optional[tuple]:
+        # Databases written before topic_versions existed still have a paper count
+        row = self._connection().execute(
+            "SELECT COUNT(*), (SELECT version FROM topic_versions WHERE topic = ?) "
+            "FROM topic_papers WHERE topic = ?",
+            (topic_dir, topic_dir),
+        ).fetchone()
+        if row[0] == 0:
+            return None
+        return (row[1] or 0, row[0])
+
+    def list_topics(self) -> List[str]:
+        rows = self._connection().execute(
+            "SELECT DISTINCT topic FROM topic_papers ORDER BY topic"
+        ).fetchall()
+        return [row["topic"] for row in rows]
+
+    def topic_stats(self, topic_dirs: Optional[List[str]] = None) -> Dict[str, Dict]:
+        where, params = "", ()
+        if topic_dirs is not None:
+            if not topic_dirs:
+                return {}
+            where = f"WHERE topic_papers.topic IN ({', '.join('?' * len(topic_dirs))})"
+            params = tuple(topic_dirs)
+        rows = self._connection().execute(
+            "SELECT topic_papers.topic AS topic, COUNT(*) AS papers, "
+            "MAX(topic_versions.updated_at) AS updated FROM topic_papers "
+            "LEFT JOIN topic_versions ON topic_versions.topic = topic_papers.topic "
+            f"{where} GROUP BY topic_papers.topic ORDER BY topic_papers.topic",
+            params,
+        ).fetchall()
+        return {
+            row["topic"]: {"papers": row["papers"], "updated": row["updated"] or 0.0}
+            for row in rows
+        }
+
+    def papers_by_author(self, author: str) -> Dict[str, Dict]:
+        return self._load(
+            "papers.id IN (SELECT paper_id FROM authors WHERE name = ?)", (author,)
+        )
+
+    def papers_published_between(self, start: str, end: str) -> Dict[str, Dict]:
+        return self._load("papers.published BETWEEN ? AND ?", (start, end))
+
+
+class BinaryStorage(PaperStorage):
+    """
+    Stores papers in compact append-only files that are read through mmap.
+
+    Under `<paper_dir>/.binary/`:
+
+    - `records.bin` holds the fields of each record one after another.
+      Fields of at least COMPRESS_MIN bytes (in practice the summary) are
+      zlib-compressed on their own.
+    - `index.bin` holds one fixed-size entry per record: the record's
+      offset, the length of each field and which fields are compressed.
+    - `paper_ids.txt` holds the paper ID of each entry, one per line.
+    - `topics/<topic>.ids` lists the IDs of a topic's papers.
+
+    Only the paper IDs are kept in memory, mapped to their latest entry.
+    A lookup reads one index entry and only the requested fields from the
+    mapped records, so `get_paper` or one page of a topic touches
+    kilobytes however large the store is. A paper that changes gets a new
+    entry; the old one stays in the file and is no longer referenced.
+
+    Writers hold an flock on the store and append records, then index
+    entries, then IDs, so readers in other processes only see entries
+    whose data is complete. A writer first trims a tail left by a crash.
+    """
+
+    def __init__(self, paper_dir: str = PAPER_DIR):
+        self.paper_dir = paper_dir
+        self.store_dir = os.path.join(paper_dir, BINARY_DIR)
+        self.topics_dir = os.path.join(self.store_dir, "topics")
+        os.makedirs(self.topics_dir, exist_ok=True)
+        self._records_path = os.path.join(self.store_dir, "records.bin")
+        self._index_path = os.path.join(self.store_dir, "index.bin")
+        self._ids_path = os.path.join(self.store_dir, "paper_ids.txt")
+        for path in (self._records_path, self._index_path, self._ids_path):
+            open(path, "ab").close()
+
+        # paper_id -> entry number of its latest record
+        self._rows = {}
+        self._entries = 0
+        self._ids_read = 0
+        self._maps = {}
+        # topic_dir -> (file size, paper IDs in order, version, size of complete lines)
+        self._topics = {}
+        self._lock = threading.RLock()
+
+    def _locked(self):
+        return file_lock(os.path.join(self.store_dir, ".lock"))
+
+    def _refresh(self) -> None:
+        """Pick up entries appended since the last call, by any process."""
+        size = os.path.getsize(self._ids_path)
+        if size <= self._ids_read:
+            return
+        with open(self._ids_path, "rb") as ids_file:
+            ids_file.seek(self._ids_read)
+            data = ids_file.read(size - self._ids_read)
+        # A line still being written is picked up next time
+        complete = data[:data.rfind(b"\n") + 1]
+        for paper_id in complete.decode().splitlines():
+            self._rows[paper_id] = self._entries
+            self._entries += 1
+        self._ids_read += len(complete)
+
+    def _map(self, path: str, end: int) -> mmap.mmap:
+        """Return a read-only map of `path` covering at least `end` bytes."""
+        mapped = self._maps.get(path)
+        if mapped is None or len(mapped) < end:
+            with open(path, "rb") as mapped_file:
+                mapped = mmap.mmap(mapped_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._maps[path] = mapped
+        return mapped
+
+    def _entry(self, row: int) -> tuple:
+        index = self._map(self._index_path, (row + 1) * INDEX_ENTRY.size)
+        return INDEX_ENTRY.unpack_from(index, row * INDEX_ENTRY.size)
+
+    def _raw_fields(self, row: int) -> List[bytes]:
+        offset, *lengths, compressed = self._entry(row)
+        records = self._map(self._records_path, offset + sum(lengths))
+        blobs = []
+        for length in lengths:
+            blobs.append(records[offset:offset + length])
+            offset += length
+        return blobs + [compressed]
+
+    def _decode(self, row: int, fields: Optional[List[str]] = None) -> Dict:
+        offset, *lengths, compressed = self._entry(row)
+        records = self._map(self._records_path, offset + sum(lengths))
+        paper_info = {}
+        for i, (name, length) in enumerate(zip(BINARY_FIELDS, lengths)):
+            if fields is None or name in fields:
+                blob = records[offset:offset + length]
+                if compressed & (1 << i):
+                    blob = zlib.decompress(blob)
+                value = blob.decode()
+                paper_info[name] = json.loads(value) if name == "authors" else value
+            offset += length
+        return paper_info
+
+    @staticmethod
+    def _encode(paper_info: Dict) -> List:
+        blobs = []
+        compressed = 0
+        for i, name in enumerate(BINARY_FIELDS):
+            value = paper_info[name]
+            blob = (json.dumps(value) if name == "authors" else value).encode()
+            if len(blob) >= COMPRESS_MIN:
+                packed = zlib.compress(blob)
+                if len(packed) < len(blob):
+                    blob = packed
+                    compressed |= 1 << i
+            blobs.append(blob)
+        return blobs + [compressed]
+
+    def _trim(self) -> int:
+        """Cut a partial tail left by a crashed writer; return the end of the records."""
+        if os.path.getsize(self._ids_path) > self._ids_read:
+            os.truncate(self._ids_path, self._ids_read)
+        index_size = self._entries * INDEX_ENTRY.size
+        if os.path.getsize(self._index_path) > index_size:
+            os.truncate(self._index_path, index_size)
+        end = 0
+        if self._entries:
+            offset, *lengths, _ = self._entry(self._entries - 1)
+            end = offset + sum(lengths)
+        if os.path.getsize(self._records_path) > end:
+            os.truncate(self._records_path, end)
+        return end
+
+    def _topic_path(self, topic_dir: str) -> str:
+        return os.path.join(self.topics_dir, f"{topic_dir}.ids")
+
+    def _topic(self, topic_dir: str) -> Optional[tuple]:
+        try:
+            size = os.path.getsize(self._topic_path(topic_dir))
+        except FileNotFoundError:
+            self._topics.pop(topic_dir, None)
+            return None
+        cached = self._topics.get(topic_dir)
+        if cached is not None and cached[0] == size:
+            return cached
+        with open(self._topic_path(topic_dir), "rb") as topic_file:
+            data = topic_file.read(size)
+        complete = data.rfind(b"\n") + 1
+        paper_ids = list(dict.fromkeys(data[:complete].decode().splitlines()))
+        self._topics[topic_dir] = (size, paper_ids, None, complete)
+        return self._topics[topic_dir]
+
+    def add_papers(self, topic_dir: str, papers: Dict[str, Dict]) -> str:
+        with self._lock, self._locked():
+            self._refresh()
+            end = self._trim()
+
+            # Only papers that are new or changed get a new entry
+            records, entries, ids = [], [], []
+            for paper_id, paper_info in papers.items():
+                encoded = self._encode(paper_info)
+                row = self._rows.get(paper_id)
+                if row is not None and self._raw_fields(row) == encoded:
+                    continue
+                *blobs, compressed = encoded
+                entries.append(INDEX_ENTRY.pack(end, *(len(blob) for blob in blobs), compressed))
+                records.extend(blobs)
+                ids.append(paper_id)
+                end += sum(len(blob) for blob in blobs)
+
+            if ids:
+                for path, data in (
+                    (self._records_path, b"".join(records)),
+                    (self._index_path, b"".join(entries)),
+                    (self._ids_path, "".join(f"{paper_id}\n" for paper_id in ids).encode()),
+                ):
+                    with open(path, "ab") as data_file:
+                        data_file.write(data)
+                        data_file.flush()
+                        os.fsync(data_file.fileno())
+                self._refresh()
+
+            topic = self._topic(topic_dir)
+            if topic is not None and topic[3] < topic[0]:
+                os.truncate(self._topic_path(topic_dir), topic[3])
+            known = set(topic[1]) if topic else set()
+            added = [paper_id for paper_id in papers if paper_id not in known]
+            if added or topic is None:
+                with open(self._topic_path(topic_dir), "ab") as topic_file:
+                    topic_file.write("".join(f"{paper_id}\n" for paper_id in added).encode())
+                    topic_file.flush()
+                    os.fsync(topic_file.fileno())
+        return self._topic_path(topic_dir)
+
+    def get_paper(self, paper_id: str) -> Optional[Dict]:
+        return self.get_papers([paper_id])[paper_id]
+
+    def get_papers(self, paper_ids: List[str], fields: Optional[List[str]] = None) -> Dict[str, Optional[Dict]]:
+        with self._lock:
+            self._refresh()
+            found = dict.fromkeys(paper_ids)
+            for paper_id in found:
+                row = self._rows.get(paper_id)
+                if row is not None:
+                    found[paper_id] = self._decode(row, fields)
+            return found
+
+    def topic_paper_ids(self, topic_dir: str) -> Optional[List[str]]:
+        with self._lock:
+            topic = self._topic(topic_dir)
+            return list(topic[1]) if topic and topic[1] else None
+
+    def get_topic_papers(self, topic_dir: str) -> Optional[Dict[str, Dict]]:
+        paper_ids = self.topic_paper_ids(topic_dir)
+        if paper_ids is None:
+            return None
+        return {
+            paper_id: paper_info
+            for paper_id, paper_info in self.get_papers(paper_ids).items()
+            if paper_info is not None
+        }
+
+    def topic_version(self, topic_dir: str) -> Optional[tuple]:
+        with self._lock:
+            self._refresh()
+            topic = self._topic(topic_dir)
+            if topic is None or not topic[1]:
+                return None
+            size, paper_ids, version, complete = topic
+            # A shared paper can change through another topic, which gives it
+            # a new entry, so the version includes the newest entry it uses
+            if version is None or version[1] != self._entries:
+                newest = max(self._rows.get(paper_id, -1) for paper_id in paper_ids)
+                version = (size, self._entries, newest)
+                self._topics[topic_dir] = (size, paper_ids, version, complete)
+            return (version[0], version[2])
+
+    def list_topics(self) -> List[str]:
+        return sorted(
+            name[:-len(".ids")] for name in os.listdir(self.topics_dir) if name.endswith(".ids")
+        )
+
+    def topic_stats(self, topic_dirs: Optional[List[str]] = None) -> Dict[str, Dict]:
+        stats = {}
+        with self._lock:
+            for topic_dir in self.list_topics() if topic_dirs is None else topic_dirs:
+                topic = self._topic(topic_dir)
+                if topic is None or not topic[1]:
+                    continue
+                stats[topic_dir] = {
+                    "papers": len(topic[1]),
+                    "updated": os.path.getmtime(self._topic_path(topic_dir)),
+                }
+        return stats
+
+    def _scan(self, fields: List[str], keep) -> Dict[str, Dict]:
+        with self._lock:
+            self._refresh()
+            # Decode the fields the filter needs first, the rest only for matches
+            return {
+                paper_id: self._decode(row)
+                for paper_id, row in self._rows.items()
+                if keep(self._decode(row, fields))
+            }
+
+    def papers_by_author(self, author: str) -> Dict[str, Dict]:
+        return self._scan(["authors"], lambda paper_info: author in paper_info["authors"])
+
+    def papers_published_between(self, start: str, end: str) -> Dict[str, Dict]:
+        return self._scan(["published"], lambda paper_info: start <= paper_info["published"] <= end)
+
+
+_storage = {}
+
+
+def get_storage(paper_dir: str = PAPER_DIR) -> PaperStorage:
+    """
+    Return the process-wide storage backend for `paper_dir`.
+
+    The backend is chosen with the PAPER_STORAGE environment variable
+    ("json", the default, "sqlite" or "binary"). The SQLite database lives
+    at PAPER_DB, or `<paper_dir>/papers.db` if that is not set; the binary
+    store lives in `<paper_dir>/.binary`.
+    """
+    if paper_dir not in _storage:
+        backend = os.getenv("PAPER_STORAGE", "json").lower()
+        if backend == "sqlite":
+            db_path = os.getenv("PAPER_DB", os.path.join(paper_dir, DB_FILE))
+            _storage[paper_dir] = SqliteStorage(db_path)
+        elif backend == "json":
+            _storage[paper_dir] = JsonStorage(paper_dir)
+        elif backend == "binary":
+            _storage[paper_dir] = BinaryStorage(paper_dir)
+        else:
+            raise ValueError(f"Unknown PAPER_STORAGE backend: {backend}")
+    return _storage[paper_dir]
+
+
+def migrate_json_to_sqlite(paper_dir: str = PAPER_DIR, db_path: Optional[str] = None) -> int:
+    """
+    Import every `papers_info.json` topic folder into a SQLite database.
+
+    Args:
+        paper_dir: Root directory holding one folder per topic
+        db_path: Database to write to (default: `<paper_dir>/papers.db`)
+
+    Returns:
+        Number of topic folders imported
+    """
+    return _import_json_topics(paper_dir, SqliteStorage(db_path or os.path.join(paper_dir, DB_FILE)))
+
+
+def migrate_json_to_binary(paper_dir: str = PAPER_DIR) -> int:
+    """
+    Import every JSON topic folder into the binary store in `<paper_dir>/.binary`.
+
+    Returns:
+        Number of topic folders imported
+    """
+    return _import_json_topics(paper_dir, BinaryStorage(paper_dir))
+
+
+def _import_json_topics(paper_dir: str, target: PaperStorage) -> int:
+    source = JsonStorage(paper_dir)
+
+    migrated = 0
+    for topic_dir in source.list_topics():
+        try:
+            papers = source.get_topic_papers(topic_dir)
+        except json.JSONDecodeError as e:
+            print(f"Skipping {topic_dir}: {str(e)}", file=sys.stderr)
+            continue
+        if papers:
+            target.add_papers(topic_dir, papers)
+            migrated += 1
+            print(f"Imported {len(papers)} papers from {topic_dir}", file=sys.stderr)
+    return migrated
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def dedup_json_topics(paper_dir: str = PAPER_DIR) -> int:
+    """
+    Move full-record JSON topic folders into the shared record store.
+
+    Each paper is kept once however many topics it was found under, and the
+    topic folders are left with ID lists. Prints the disk space saved.
+
+    Args:
+        paper_dir: Root directory holding one folder per topic
+
+    Returns:
+        Number of topic folders converted
+    """
+    before = _dir_size(paper_dir)
+    converted = JsonStorage(paper_dir).dedup_topics()
+    saved = before - _dir_size(paper_dir)
+    if before:
+        print(f"Saved {saved} bytes ({saved / before:.0%} of {before})", file=sys.stderr)
+    return converted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import JSON topic folders into SQLite.")
+    parser.add_argument("--paper-dir", default=PAPER_DIR)
+    parser.add_argument("--db", default=None)
+    parser.add_argument(
+        "--dedup",
+        action="store_true",
+        help="Move JSON topic folders into the shared record store instead",
+    )
+    parser.add_argument(
+        "--binary",
+        action="store_true",
+        help="Import JSON topic folders into the binary store (PAPER_STORAGE=binary) instead",
+    )
+    args = parser.parse_args()
+
+    if args.dedup:
+        count = dedup_json_topics(args.paper_dir)
+        print(f"Converted {count} topics")
+    elif args.binary:
+        count = migrate_json_to_binary(args.paper_dir)
+        print(f"Migrated {count} topics")
+    else:
+        count = migrate_json_to_sqlite(args.paper_dir, args.db)
+        print(f"Migrated {count} topics")
@@ -0,0 +1,136 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "900"))
+CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "256"))
+# Optional SQLite file that keeps cached results across restarts
+CACHE_DISK = os.getenv("SEARCH_CACHE_DISK")
+
+
+def cache_key(topic: str, max_results: int) -> str:
+    """Normalise a search so equivalent queries share one cache entry."""
+    return f"{' '.join(topic.lower().split())}|{max_results}"
+
+
+class SearchCache:
+    """
+    TTL + LRU cache of `search_papers` results.
+
+    Entries map a normalised (topic, max_results) query to the papers arXiv
+    returned for it. The in-memory tier holds at most `max_entries` queries
+    and evicts the least recently used one. If `disk_path` is given, entries
+    are also written to a SQLite file and read back from it on a memory miss.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = CACHE_SIZE,
+        ttl_seconds: float = CACHE_TTL,
+        disk_path: Optional[str] = CACHE_DISK,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_path = disk_path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if disk_path:
+            disk_dir = os.path.dirname(disk_path)
+            if disk_dir:
+                os.makedirs(disk_dir, exist_ok=True)
+            self._disk().execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, stored_at REAL NOT NULL, papers TEXT NOT NULL)"
+            )
+
+    def _disk(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key: str, stored_at: float, papers: Dict[str, Dict]) -> None:
+        with self._lock:
+            self._entries[key] = (stored_at, papers)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, topic: str, max_results: int) -> Optional[Dict[str, Dict]]:
+        """Return the cached papers for a query, or None on a miss or expiry."""
+        key = cache_key(topic, max_results)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.disk_path:
+            row = self._disk().execute(
+                "SELECT stored_at, papers FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and now - row[0] < self.ttl_seconds:
+                papers = json.loads(row[1])
+                self._remember(key, row[0], papers)
+                with self._lock:
+                    self.hits += 1
+                return papers
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, topic: str, max_results: int, papers: Dict[str, Dict]) -> None:
+        """Cache the papers returned for a query."""
+        key = cache_key(topic, max_results)
+        stored_at = time.time()
+        self._remember(key, stored_at, papers)
+        if self.disk_path:
+            conn = self._disk()
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, stored_at, papers) VALUES (?, ?, ?)",
+                (key, stored_at, json.dumps(papers)),
+            )
+            conn.execute(
+                "DELETE FROM results WHERE stored_at < ?", (stored_at - self.ttl_seconds,)
+            )
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and the number of in-memory entries."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Return the process-wide search cache, configured from SEARCH_CACHE_* variables."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SearchCache()
+    return _cache
@@ -1,13 +1,37 @@
-import arxiv
+import argparse
 import json
 import os
-from typing import List
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 from mcp.server.fastmcp import FastMCP
 
+from arxiv_client import fetch_papers
+from fulltext import get_fulltext_fetcher
+from local_search import get_search_index
+from metrics import metrics
+from paper_similarity import get_similarity_index
+from paper_storage import get_storage
+from search_cache import get_search_cache
+from topic_catalog import get_topic_catalog, subscriptions
+from topic_pages import get_topic_pages, parse_topic_uri
+from write_queue import get_write_queue
+
 PAPER_DIR = "papers"
 
 # Initialize FastMCP server
 mcp = FastMCP("research")
+# Accept resource subscriptions and send list-changed/updated notifications
+subscriptions.enable(mcp)
+# Time tool calls and resource reads; set RESEARCH_METRICS_LOG=stderr (or a
+# file path) to log one JSON line per call, since stdout carries the protocol
+metrics.instrument(mcp)
+
+# Maximum number of topics a batch search works on at the same time
+BATCH_CONCURRENCY = int(os.getenv("RESEARCH_BATCH_CONCURRENCY", "4"))
+# Address the server listens on when run with --daemon
+DAEMON_HOST = os.getenv("RESEARCH_DAEMON_HOST", "127.0.0.1")
+DAEMON_PORT = int(os.getenv("RESEARCH_DAEMON_PORT", "8002"))
 
 
 @mcp.tool()
@@ -23,51 +47,27 @@ def search_papers(topic: str, max_results: int = 5) -> List[str]:
         List of paper IDs found in the search
     """
     
-    # Use arxiv to find the papers 
-    client = arxiv.Client()
-
-    # Search for the most relevant articles matching the queried topic
-    search = arxiv.Search(
-        query=topic,
-        max_results=max_results,
-        sort_by=arxiv.SortCriterion.Relevance
-    )
-
-    papers = client.results(search)
-    
-    # Create directory for this topic
-    path = os.path.join(PAPER_DIR, topic.lower().replace(" ", "_"))
-    os.makedirs(path, exist_ok=True)
+    # Reuse recent results for the same query before going back to arXiv
+    cache = get_search_cache()
+    papers_info = cache.get(topic, max_results)
+    if papers_info is None:
+        papers_info = fetch_papers(topic, max_results)
+        cache.put(topic, max_results, papers_info)
     
-    file_path = os.path.join(path, "papers_info.json")
-
-    # Try to load existing papers info
-    try:
-        with open(file_path, "r") as json_file:
-            papers_info = json.load(json_file)
-    except (FileNotFoundError, json.JSONDecodeError):
-        papers_info = {}
-
-    # Process each paper and add to papers_info  
-    paper_ids = []
-    for paper in papers:
-        paper_ids.append(paper.get_short_id())
-        paper_info = {
-            'title': paper.title,
-            'authors': [author.name for author in paper.authors],
-            'summary': paper.summary,
-            'pdf_url': paper.pdf_url,
-            'published': str(paper.published.date())
-        }
-        papers_info[paper.get_short_id()] = paper_info
+    # Save the papers under the directory for this topic, which also
+    # registers cached results against the topic folder. Writes go through
+    # the write queue, which merges concurrent writes to the same topic and
+    # updates the topic catalogue once they are stored
+    topic_dir = topic.lower().replace(" ", "_")
+    location = get_write_queue(PAPER_DIR).add_papers(topic_dir, papers_info)
     
-    # Save updated papers_info to json file
-    with open(file_path, "w") as json_file:
-        json.dump(papers_info, json_file, indent=2)
+    # Make the stored papers searchable with search_local and related_papers
+    get_search_index(PAPER_DIR).add_papers(topic_dir, papers_info)
+    get_similarity_index(PAPER_DIR).add_papers(papers_info)
     
-    print(f"Results are saved in: {file_path}")
+    print(f"Results are saved in: {location}", file=sys.stderr)
     
-    return paper_ids
+    return list(papers_info)
 
 
 @mcp.tool()
@@ -82,51 +82,178 @@ def extract_info(paper_id: str) -> str:
         JSON string with paper information if found, error message if not found
     """
  
-    for item in os.listdir(PAPER_DIR):
-        item_path = os.path.join(PAPER_DIR, item)
-        if os.path.isdir(item_path):
-            file_path = os.path.join(item_path, "papers_info.json")
-            if os.path.isfile(file_path):
-                try:
-                    with open(file_path, "r") as json_file:
-                        papers_info = json.load(json_file)
-                        if paper_id in papers_info:
-                            return json.dumps(papers_info[paper_id], indent=2)
-                except (FileNotFoundError, json.JSONDecodeError) as e:
-                    print(f"Error reading {file_path}: {str(e)}")
-                    continue
+    paper_info = get_storage(PAPER_DIR).get_paper(paper_id)
+    if paper_info is not None:
+        return json.dumps(paper_info, indent=2)
     
     return f"There's no saved information related to paper {paper_id}."
 
 
+@mcp.tool()
+def search_papers_batch(topics: List[str], max_results: int = 5) -> Dict:
+    """
+    Search for papers on arXiv for several topics at once and store their information.
+    
+    Topics are searched concurrently, at most RESEARCH_BATCH_CONCURRENCY at a
+    time, and a failing topic does not affect the others.
+    
+    Args:
+        topics: The topics to search for
+        max_results: Maximum number of results to retrieve per topic (default: 5)
+        
+    Returns:
+        One entry per topic, in order, with either its paper IDs or an error
+    """
+    def search_one(topic: str) -> Dict:
+        try:
+            return {"topic": topic, "paper_ids": search_papers(topic, max_results)}
+        except Exception as e:
+            return {"topic": topic, "error": str(e)}
+
+    with ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY) as executor:
+        return {"results": list(executor.map(search_one, topics))}
+
+
+@mcp.tool()
+def extract_info_batch(paper_ids: List[str]) -> Dict:
+    """
+    Look up the stored information for several papers at once.
+    
+    The paper-ID index is consulted once and each topic folder is read at most
+    once, however many of the requested papers it holds.
+    
+    Args:
+        paper_ids: The IDs of the papers to look for
+        
+    Returns:
+        One entry per paper ID, in order, with either its information or an error
+    """
+    papers = get_storage(PAPER_DIR).get_papers(paper_ids)
+    
+    results = []
+    for paper_id in paper_ids:
+        paper_info = papers[paper_id]
+        if paper_info is not None:
+            results.append({"paper_id": paper_id, "paper": paper_info})
+        else:
+            results.append({
+                "paper_id": paper_id,
+                "error": f"There's no saved information related to paper {paper_id}."
+            })
+    
+    return {"results": results}
+
+
+@mcp.tool()
+def search_local(
+    query: str,
+    max_results: int = 10,
+    topic: Optional[str] = None,
+    published_after: Optional[str] = None,
+    published_before: Optional[str] = None,
+) -> Dict:
+    """
+    Search the papers already stored locally, without contacting arXiv.
+    
+    Titles, summaries and authors are ranked against the query with BM25.
+    
+    Args:
+        query: The words to look for
+        max_results: Maximum number of papers to return (default: 10)
+        topic: Only search papers stored under this topic
+        published_after: Only return papers published on or after this date (YYYY-MM-DD)
+        published_before: Only return papers published on or before this date (YYYY-MM-DD)
+        
+    Returns:
+        The matching papers, best match first, with their ID, title, publication date and topics
+    """
+    topic_dir = topic.lower().replace(" ", "_") if topic else None
+    results = get_search_index(PAPER_DIR).search(
+        query,
+        max_results,
+        topic_dir,
+        published_after,
+        published_before,
+    )
+    
+    return {"results": results}
+
+
+@mcp.tool()
+def related_papers(paper_id: str, k: int = 5) -> Dict:
+    """
+    Find the stored papers most similar to a given stored paper.
+    
+    Papers are compared by the cosine similarity of the TF-IDF vectors of
+    their summaries.
+    
+    Args:
+        paper_id: The ID of the paper to compare against
+        k: Number of related papers to return (default: 5)
+        
+    Returns:
+        The related papers, most similar first, with their ID, title and similarity score
+    """
+    related = get_similarity_index(PAPER_DIR).related(paper_id, k)
+    if related is None:
+        return {"error": f"There's no saved information related to paper {paper_id}."}
+    
+    papers = get_storage(PAPER_DIR).get_papers(
+        [entry["paper_id"] for entry in related], fields=["title"]
+    )
+    for entry in related:
+        paper_info = papers.get(entry["paper_id"])
+        entry["title"] = paper_info["title"] if paper_info else None
+    
+    return {"results": related}
+
+
+@mcp.tool()
+def fetch_fulltext(paper_ids: List[str], max_chars: int = 20000) -> Dict:
+    """
+    Get the full text of stored papers from their PDFs.
+    
+    PDFs are downloaded a few at a time and their text is extracted in
+    worker processes. Both are cached, so repeated requests are served
+    from disk.
+    
+    Args:
+        paper_ids: The IDs of the papers to read
+        max_chars: Maximum number of characters returned per paper (default: 20000)
+        
+    Returns:
+        One entry per paper ID, in order, with either its text or an error
+    """
+    fetched = get_fulltext_fetcher(PAPER_DIR).fetch(paper_ids)
+    
+    results = []
+    for paper_id in paper_ids:
+        entry = fetched[paper_id]
+        if "error" in entry:
+            results.append({"paper_id": paper_id, "error": entry["error"]})
+            continue
+        text = entry["text"]
+        results.append({
+            "paper_id": paper_id,
+            "text": text[:max_chars],
+            "cached": entry["cached"],
+            "truncated": len(text) > max_chars,
+            "total_chars": len(text),
+        })
+    
+    return {"results": results}
+
+
 @mcp.resource("papers://folders")
 def get_available_folders() -> str:
     """
     List all available topic folders in the papers directory.
     
-    This resource provides a simple list of all available topic folders.
-    """
-    folders = []
-    
-    # Get all topic directories
-    if os.path.exists(PAPER_DIR):
-        for topic_dir in os.listdir(PAPER_DIR):
-            topic_path = os.path.join(PAPER_DIR, topic_dir)
-            if os.path.isdir(topic_path):
-                papers_file = os.path.join(topic_path, "papers_info.json")
-                if os.path.exists(papers_file):
-                    folders.append(topic_dir)
-    
-    # Create a simple markdown list
-    content = "# Available Topics\n\n"
-    if folders:
-        for folder in folders:
-            content += f"- {folder}\n"
-        content += f"\nUse @{folder} to access papers in that topic.\n"
-    else:
-        content += "No topics found.\n"
-    
-    return content
+    The list comes from an in-memory catalogue with each topic's paper count
+    and last update. Clients can subscribe to this resource and to
+    papers://{topic} to be notified when they change.
+    """
+    return get_topic_catalog(PAPER_DIR).render()
 
 
 @mcp.resource("papers://{topic}")
@@ -134,35 +261,25 @@ def get_topic_papers(topic: str) -> str:
     """
     Get detailed information about papers on a specific topic.
     
+    Large topics are split into pages; request later pages with
+    papers://{topic}?page=N.
+    
     Args:
-        topic: The research topic to retrieve papers for
+        topic: The research topic to retrieve papers for, optionally followed by ?page=N
     """
+    topic, page = parse_topic_uri(topic)
     topic_dir = topic.lower().replace(" ", "_")
-    papers_file = os.path.join(PAPER_DIR, topic_dir, "papers_info.json")
-    
-    if not os.path.exists(papers_file):
-        return f"# No papers found for topic: {topic}\n\nTry searching for papers on this topic first."
     
+    # Rendered papers are cached per topic until the stored papers change
     try:
-        with open(papers_file, 'r') as f:
-            papers_data = json.load(f)
-        
-        # Create markdown content with paper details
-        content = f"# Papers on {topic.replace('_', ' ').title()}\n\n"
-        content += f"Total papers: {len(papers_data)}\n\n"
-        
-        for paper_id, paper_info in papers_data.items():
-            content += f"## {paper_info['title']}\n"
-            content += f"- **Paper ID**: {paper_id}\n"
-            content += f"- **Authors**: {', '.join(paper_info['authors'])}\n"
-            content += f"- **Published**: {paper_info['published']}\n"
-            content += f"- **PDF URL**: [{paper_info['pdf_url']}]({paper_info['pdf_url']})\n\n"
-            content += f"### Summary\n{paper_info['summary'][:500]}...\n\n"
-            content += "---\n\n"
-        
-        return content
+        content = get_topic_pages(PAPER_DIR).render(topic, topic_dir, page)
     except json.JSONDecodeError:
         return f"# Error reading papers data for {topic}\n\nThe papers data file is corrupted."
+    
+    if content is None:
+        return f"# No papers found for topic: {topic}\n\nTry searching for papers on this topic first."
+    
+    return content
 
 
 @mcp.prompt()
@@ -193,5 +310,26 @@ Please present both detailed information about each paper and a high-level synth
 
 
 if __name__ == "__main__":
-    # Initialize and run the server
-    mcp.run(transport='stdio')
+    parser = argparse.ArgumentParser(description="Run the research MCP server.")
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running with warm caches and serve streamable HTTP on "
+             "RESEARCH_DAEMON_HOST:RESEARCH_DAEMON_PORT instead of stdio",
+    )
+    args = parser.parse_args()
+
+    if args.daemon:
+        # One long-lived process that chatbots attach to, so the caches and
+        # indexes stay warm between chatbot runs. Several chatbots can be
+        # attached at once, so serve the SSE server's tools, which run their
+        # blocking work in a thread pool instead of on the event loop
+        from sse_server import mcp as daemon_mcp
+
+        daemon_mcp.settings.host = DAEMON_HOST
+        daemon_mcp.settings.port = DAEMON_PORT
+        print(f"Research daemon listening on http://{DAEMON_HOST}:{DAEMON_PORT}/mcp", file=sys.stderr)
+        daemon_mcp.run(transport='streamable-http')
+    else:
+        # Initialize and run the server
+        mcp.run(transport='stdio')
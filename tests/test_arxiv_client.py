@@ -0,0 +1,133 @@
+import http.server
+import threading
+import time
+import unittest
+import urllib.parse
+
+import arxiv
+
+import arxiv_client
+from arxiv_client import RateLimiter, SharedClient
+
+
+TOTAL_RESULTS = 5
+
+
+def atom_entry(i: int) -> str:
+    return f"""<entry>
+<id>http://arxiv.org/abs/2401.{i:05d}v1</id>
+<updated>2024-01-02T00:00:00Z</updated>
+<published>2024-01-01T00:00:00Z</published>
+<title>Paper {i}</title>
+<summary>Summary of paper {i}</summary>
+<author><name>Author {i}</name></author>
+<link href="http://arxiv.org/abs/2401.{i:05d}v1" rel="alternate" type="text/html"/>
+<link title="pdf" href="http://arxiv.org/pdf/2401.{i:05d}v1" rel="related" type="application/pdf"/>
+<arxiv:primary_category xmlns:arxiv="http://arxiv.org/schemas/atom" term="cs.CL"/>
+<category term="cs.CL"/>
+</entry>"""
+
+
+class FakeArxivHandler(http.server.BaseHTTPRequestHandler):
+    """Answers arXiv API queries with TOTAL_RESULTS made-up papers; fails the first `failures` requests."""
+
+    failures = 0
+    requests = 0
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        type(self).requests += 1
+        if type(self).failures > 0:
+            type(self).failures -= 1
+            self.send_response(503)
+            self.end_headers()
+            return
+
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        start, count = int(query["start"][0]), int(query["max_results"][0])
+        body = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/">'
+            f"<opensearch:totalResults>{TOTAL_RESULTS}</opensearch:totalResults>"
+            + "".join(atom_entry(i) for i in range(start, min(TOTAL_RESULTS, start + count)))
+            + "</feed>"
+        )
+        self.send_response(200)
+        self.send_header("Content-Type", "application/atom+xml")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+
+class SharedClientTest(unittest.TestCase):
+    def setUp(self):
+        FakeArxivHandler.failures = 0
+        FakeArxivHandler.requests = 0
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakeArxivHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.api_url = f"http://127.0.0.1:{self.server.server_address[1]}/api/query"
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        # fetch_papers uses the process-wide client, so point it at the fake
+        self.addCleanup(setattr, arxiv_client, "_client", arxiv_client._client)
+
+    def client(self, **kwargs) -> SharedClient:
+        return SharedClient(api_url=self.api_url, delay_seconds=0, backoff_seconds=0, **kwargs)
+
+    def test_fetch_papers_uses_the_injected_client(self):
+        arxiv_client._client = self.client()
+
+        papers = arxiv_client.fetch_papers("anything", max_results=3)
+
+        self.assertEqual(list(papers), ["2401.00000v1", "2401.00001v1", "2401.00002v1"])
+        self.assertEqual(papers["2401.00001v1"], {
+            "title": "Paper 1",
+            "authors": ["Author 1"],
+            "summary": "Summary of paper 1",
+            "pdf_url": "http://arxiv.org/pdf/2401.00001v1",
+            "published": "2024-01-01",
+        })
+        self.assertIs(arxiv_client.get_client(), arxiv_client._client)
+
+    def test_failed_requests_are_retried(self):
+        FakeArxivHandler.failures = 2
+        arxiv_client._client = self.client(num_retries=2)
+
+        papers = arxiv_client.fetch_papers("anything", max_results=2)
+
+        self.assertEqual(len(papers), 2)
+        self.assertEqual(FakeArxivHandler.requests, 3)
+
+    def test_error_is_raised_once_retries_run_out(self):
+        FakeArxivHandler.failures = 2
+        arxiv_client._client = self.client(num_retries=1)
+
+        with self.assertRaises(arxiv.HTTPError):
+            arxiv_client.fetch_papers("anything", max_results=2)
+        self.assertEqual(FakeArxivHandler.requests, 2)
+
+
+class RateLimiterTest(unittest.TestCase):
+    def test_calls_from_several_threads_are_spaced(self):
+        limiter = RateLimiter(0.05)
+        times = []
+
+        def call() -> None:
+            limiter.wait()
+            times.append(time.monotonic())
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        times.sort()
+        gaps = [later - earlier for earlier, later in zip(times, times[1:])]
+        self.assertTrue(all(gap >= 0.045 for gap in gaps), gaps)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import http.server
+import os
+import tempfile
+import threading
+import unittest
+
+from fulltext import FulltextFetcher
+from paper_storage import JsonStorage
+
+
+def sample_pdf(text: str) -> bytes:
+    """Build a one-page PDF that shows `text`."""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+        b"/Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(pdf)
+    pdf += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    pdf += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    pdf += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return pdf
+
+
+class FakePdfHandler(http.server.BaseHTTPRequestHandler):
+    """Serves `pdfs[paper_id]` at /pdf/<paper_id> and 404 for anything else."""
+
+    pdfs = {}
+    requests = []
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        paper_id = self.path.rsplit("/", 1)[-1]
+        type(self).requests.append(paper_id)
+        pdf = self.pdfs.get(paper_id)
+        if pdf is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/pdf")
+        self.send_header("Content-Length", str(len(pdf)))
+        self.end_headers()
+        self.wfile.write(pdf)
+
+
+class FulltextFetcherTest(unittest.TestCase):
+    def setUp(self):
+        FakePdfHandler.pdfs = {"2401.00001v1": sample_pdf("Attention is all you need")}
+        FakePdfHandler.requests = []
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), FakePdfHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        paper_dir = tmp.name
+        storage = JsonStorage(paper_dir)
+        storage.add_papers("transformers", {
+            paper_id: {
+                "title": "A paper",
+                "authors": ["An Author"],
+                "summary": "A summary",
+                "pdf_url": f"http://arxiv.org/pdf/{paper_id}",
+                "published": "2024-01-01",
+            }
+            for paper_id in ("2401.00001v1", "2401.00002v1")
+        })
+        self.cache_dir = os.path.join(paper_dir, ".fulltext")
+        self.fetcher = FulltextFetcher(
+            storage,
+            self.cache_dir,
+            concurrency=2,
+            workers=1,
+            pdf_base_url=f"http://127.0.0.1:{server.server_address[1]}/pdf",
+        )
+        self.addCleanup(lambda: self.fetcher._extractors and self.fetcher._extractors.shutdown())
+
+    def test_text_is_extracted_then_served_from_the_cache(self):
+        first = self.fetcher.fetch(["2401.00001v1"])["2401.00001v1"]
+        second = self.fetcher.fetch(["2401.00001v1"])["2401.00001v1"]
+
+        self.assertIn("Attention is all you need", first["text"])
+        self.assertFalse(first["cached"])
+        self.assertEqual(second, {"text": first["text"], "cached": True})
+        self.assertEqual(FakePdfHandler.requests, ["2401.00001v1"])
+
+    def test_failures_are_reported_per_paper_and_not_cached(self):
+        results = self.fetcher.fetch(["2401.00002v1", "unknown", "2401.00001v1"])
+
+        self.assertEqual(list(results), ["2401.00002v1", "unknown", "2401.00001v1"])
+        self.assertIn("Could not fetch the full text", results["2401.00002v1"]["error"])
+        self.assertIn("no saved information", results["unknown"]["error"])
+        self.assertIn("Attention", results["2401.00001v1"]["text"])
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, "2401.00002v1.pdf")))
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, "2401.00002v1.txt")))
+
+
+if __name__ == "__main__":
+    unittest.main()
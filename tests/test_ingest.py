@@ -0,0 +1,103 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from ingest import TopicRules, ingest, parse_record, write_synthetic_dump
+from paper_storage import JsonStorage, SqliteStorage
+
+
+RECORD = {
+    "id": "2401.00001",
+    "authors": "Ada Lovelace and Alan Turing",
+    "title": "Attention\n  Is All You Need",
+    "abstract": "  We propose a new\n  architecture.\n",
+    "categories": "cs.CL cs.LG",
+    "versions": [
+        {"version": "v1", "created": "Mon, 1 Jan 2024 12:00:00 GMT"},
+        {"version": "v2", "created": "Mon, 8 Jan 2024 12:00:00 GMT"},
+    ],
+    "update_date": "2024-01-08",
+    "authors_parsed": [["Lovelace", "Ada", ""], ["Turing", "Alan", ""]],
+}
+
+
+class ParseRecordTest(unittest.TestCase):
+    def test_record_maps_to_the_search_papers_schema(self):
+        paper_id, paper_info, categories = parse_record(RECORD)
+
+        self.assertEqual(paper_id, "2401.00001v2")
+        self.assertEqual(paper_info, {
+            "title": "Attention Is All You Need",
+            "authors": ["Ada Lovelace", "Alan Turing"],
+            "summary": "We propose a new architecture.",
+            "pdf_url": "http://arxiv.org/pdf/2401.00001v2",
+            "published": "2024-01-01",
+        })
+        self.assertEqual(categories, ["cs.CL", "cs.LG"])
+
+    def test_null_optional_fields_are_empty(self):
+        record = {"id": "2401.00002", "title": "A title", "abstract": None, "authors": None,
+                  "categories": None, "versions": None, "update_date": None}
+
+        paper_id, paper_info, categories = parse_record(record)
+
+        self.assertEqual(paper_id, "2401.00002v1")
+        self.assertEqual((paper_info["summary"], paper_info["authors"], categories), ("", [], []))
+
+    def test_malformed_records_raise_value_error(self):
+        for record in (None, [1, 2], "text", {"id": "2401.00003"}, {"id": "2401.00003", "title": None}):
+            with self.subTest(record=record), self.assertRaises(ValueError):
+                parse_record(record)
+
+
+class IngestTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def test_malformed_lines_are_counted_and_skipped(self):
+        path = os.path.join(self.dir, "dump.json")
+        with open(path, "w") as dump:
+            dump.write(json.dumps(RECORD) + "\n")
+            dump.write("not json\n")
+            dump.write("[1, 2]\n")
+            dump.write(json.dumps({"id": "2401.00004", "title": None}) + "\n")
+            dump.write("\n")
+            dump.write(json.dumps({**RECORD, "id": "2401.00005", "abstract": None}) + "\n")
+        storage = JsonStorage(os.path.join(self.dir, "papers"))
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            stats = ingest(path, storage, TopicRules(), progress_seconds=0)
+
+        self.assertEqual((stats["read"], stats["matched"], stats["invalid"]), (5, 2, 3))
+        self.assertEqual(storage.topic_paper_ids("cs.cl"), ["2401.00001v2", "2401.00005v2"])
+
+    def test_synthetic_dump_is_assigned_by_rules_in_batches(self):
+        path = os.path.join(self.dir, "dump.json.gz")
+        write_synthetic_dump(path, 500, seed=1)
+        rules = TopicRules({
+            "Language": {"categories": ["cs.CL"]},
+            "Quantum Transformers": {"categories": ["quant-ph"], "keywords": ["transformer"]},
+        })
+        storage = SqliteStorage(os.path.join(self.dir, "papers.db"))
+
+        with contextlib.redirect_stderr(io.StringIO()):
+            stats = ingest(path, storage, rules, batch_size=50, progress_seconds=0)
+
+        language = storage.get_topic_papers("language")
+        quantum = storage.get_topic_papers("quantum_transformers")
+        self.assertEqual(stats["read"], 500)
+        self.assertEqual(stats["invalid"], 0)
+        self.assertEqual(stats["topics"], 2)
+        self.assertGreater(len(language), 0)
+        self.assertTrue(all("transformer" in paper["title"].lower() + paper["summary"].lower()
+                            for paper in quantum.values()))
+        self.assertEqual(stats["matched"], len(set(language) | set(quantum)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import os
+import tempfile
+import unittest
+
+from paper_similarity import SimilarityIndex
+from paper_storage import JsonStorage
+
+
+def paper(summary: str) -> dict:
+    return {
+        "title": "A paper",
+        "authors": ["An Author"],
+        "summary": summary,
+        "pdf_url": "http://arxiv.org/pdf/0",
+        "published": "2024-01-01",
+    }
+
+
+PAPERS = {
+    "attention": paper("Attention layers replace recurrence in sequence transduction models"),
+    "transformer": paper("Transformer models built from attention layers for sequence transduction"),
+    "qubits": paper("Error correction for superconducting qubits in quantum processors"),
+}
+
+
+class SimilarityIndexTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.storage = JsonStorage(os.path.join(tmp.name, "papers"))
+        self.index_dir = os.path.join(tmp.name, "related")
+
+    def index(self) -> SimilarityIndex:
+        return SimilarityIndex(self.storage, self.index_dir, refresh_seconds=3600)
+
+    def related_ids(self, index: SimilarityIndex, paper_id: str) -> list:
+        return [result["paper_id"] for result in index.related(paper_id, k=2)]
+
+    def test_papers_sharing_terms_rank_first(self):
+        index = self.index()
+        self.assertEqual(index.add_papers(PAPERS), 3)
+        self.assertEqual(index.add_papers(PAPERS), 0)
+
+        self.assertEqual(self.related_ids(index, "attention"), ["transformer"])
+        self.assertIsNone(index.related("unknown"))
+
+    def test_changed_summary_supersedes_the_old_row(self):
+        index = self.index()
+        index.add_papers(PAPERS)
+        index.add_papers({"qubits": paper("Attention in sequence transduction models")})
+
+        self.assertEqual(len(index.ids), 4)
+        for reader in (index, self.index()):
+            self.assertEqual(sorted(self.related_ids(reader, "attention")), ["qubits", "transformer"])
+
+    def test_rows_appended_by_another_instance_are_picked_up(self):
+        index, other = self.index(), self.index()
+        index.add_papers({"attention": PAPERS["attention"]})
+        other.add_papers({"transformer": PAPERS["transformer"]})
+        index.add_papers({"qubits": PAPERS["qubits"], "transformer": PAPERS["transformer"]})
+
+        self.assertEqual(index.ids, ["attention", "transformer", "qubits"])
+        self.assertEqual(self.related_ids(index, "transformer"), ["attention"])
+
+    def test_refresh_indexes_changed_topics(self):
+        self.storage.add_papers("language", {"attention": PAPERS["attention"]})
+        self.storage.add_papers("quantum", {"qubits": PAPERS["qubits"]})
+        index = self.index()
+        index.refresh(force=True)
+        self.storage.add_papers("language", {"transformer": PAPERS["transformer"]})
+        index.refresh(force=True)
+
+        self.assertEqual(sorted(index.ids), sorted(PAPERS))
+        self.assertEqual(self.related_ids(index, "attention"), ["transformer"])
+
+    def test_torn_tail_is_dropped(self):
+        self.index().add_papers(PAPERS)
+        ids_path = os.path.join(self.index_dir, "ids.jsonl")
+        size = os.path.getsize(ids_path)
+        with open(ids_path, "a") as ids_file:
+            ids_file.write('["partial", 12')
+
+        index = self.index()
+        self.assertEqual(index.ids, list(PAPERS))
+        self.assertEqual(os.path.getsize(ids_path), size)
+
+        index.add_papers({"extra": paper("Quantum processors with superconducting qubits")})
+        self.assertEqual(self.related_ids(self.index(), "extra"), ["qubits"])
+
+
+if __name__ == "__main__":
+    unittest.main()
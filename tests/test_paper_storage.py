@@ -0,0 +1,128 @@
+import os
+import tempfile
+import unittest
+
+from paper_storage import BinaryStorage, JsonStorage, SqliteStorage
+
+
+def paper(i: int, summary: str = "A summary") -> dict:
+    return {
+        "title": f"Paper {i}",
+        "authors": [f"Author {i}", "Shared Author"],
+        "summary": summary,
+        "pdf_url": f"http://arxiv.org/pdf/{i}",
+        "published": f"2024-01-{i % 28 + 1:02d}",
+    }
+
+
+class StorageRoundTrip:
+    """Checks every backend must pass; subclasses build the storage under test."""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def storage(self):
+        raise NotImplementedError
+
+    def test_papers_added_one_at_a_time_are_all_kept(self):
+        storage = self.storage()
+        for i in range(40):
+            storage.add_papers("topic", {str(i): paper(i)})
+
+        for reader in (storage, self.storage()):
+            self.assertEqual(reader.topic_paper_ids("topic"), [str(i) for i in range(40)])
+            self.assertEqual(reader.get_topic_papers("topic")["7"], paper(7))
+            self.assertEqual(reader.get_paper("39"), paper(39))
+
+    def test_changed_papers_replace_the_stored_ones(self):
+        storage = self.storage()
+        for round_ in range(5):
+            storage.add_papers("topic", {str(i): paper(i, f"Round {round_}") for i in range(10)})
+
+        for reader in (storage, self.storage()):
+            papers = reader.get_papers([str(i) for i in range(10)] + ["missing"])
+            self.assertIsNone(papers.pop("missing"))
+            self.assertEqual({paper_info["summary"] for paper_info in papers.values()}, {"Round 4"})
+
+    def test_shared_papers_are_listed_under_each_topic(self):
+        storage = self.storage()
+        storage.add_papers("first", {"1": paper(1), "2": paper(2)})
+        storage.add_papers("second", {"2": paper(2), "3": paper(3)})
+
+        self.assertEqual(sorted(storage.list_topics()), ["first", "second"])
+        self.assertEqual(storage.topic_paper_ids("second"), ["2", "3"])
+        self.assertEqual(
+            {topic: stats["papers"] for topic, stats in storage.topic_stats().items()},
+            {"first": 2, "second": 2},
+        )
+        self.assertEqual(sorted(storage.papers_by_author("Author 2")), ["2"])
+        self.assertIsNone(storage.get_topic_papers("unknown"))
+
+    def test_topic_version_changes_only_with_the_papers(self):
+        storage = self.storage()
+        storage.add_papers("topic", {"1": paper(1)})
+        version = storage.topic_version("topic")
+
+        storage.add_papers("topic", {"1": paper(1)})
+        self.assertEqual(storage.topic_version("topic"), version)
+
+        storage.add_papers("other", {"1": paper(1, "Changed")})
+        self.assertNotEqual(storage.topic_version("topic"), version)
+
+
+class JsonStorageTest(StorageRoundTrip, unittest.TestCase):
+    def storage(self, compact_after: int = 3):
+        return JsonStorage(self.dir, compact_after=compact_after)
+
+    def test_compaction_keeps_the_batch_that_triggered_it(self):
+        storage = self.storage(compact_after=2)
+        for i in range(1, 5):
+            storage.add_papers("topic", {str(i): paper(i)})
+
+        self.assertEqual(self.storage().topic_paper_ids("topic"), ["1", "2", "3", "4"])
+
+    def test_record_shards_survive_compaction(self):
+        # Enough single adds that every record shard is compacted several times
+        storage = JsonStorage(self.dir)
+        for i in range(1000):
+            storage.add_papers("topic", {str(i): paper(i)})
+
+        reader = JsonStorage(self.dir)
+        self.assertEqual(len(reader.topic_paper_ids("topic")), 1000)
+        papers = reader.get_papers([str(i) for i in range(1000)])
+        self.assertEqual([paper_id for paper_id, info in papers.items() if info is None], [])
+
+    def test_bulk_load_keeps_every_paper(self):
+        storage = self.storage()
+        with storage.bulk_load():
+            for i in range(20):
+                storage.add_papers("topic", {str(i): paper(i)})
+            storage.add_papers("topic", {"0": paper(0, "Changed")})
+
+        reader = self.storage()
+        self.assertEqual(reader.topic_paper_ids("topic"), [str(i) for i in range(20)])
+        self.assertEqual(reader.get_paper("0")["summary"], "Changed")
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "topic", "paper_ids_log.jsonl")))
+
+
+class SqliteStorageTest(StorageRoundTrip, unittest.TestCase):
+    def storage(self):
+        return SqliteStorage(os.path.join(self.dir, "papers.db"))
+
+
+class BinaryStorageTest(StorageRoundTrip, unittest.TestCase):
+    def storage(self):
+        return BinaryStorage(self.dir)
+
+    def test_fields_can_be_read_alone(self):
+        storage = self.storage()
+        storage.add_papers("topic", {"1": paper(1, "word " * 100)})
+
+        self.assertEqual(storage.get_papers(["1"], fields=["title"])["1"], {"title": "Paper 1"})
+        self.assertEqual(self.storage().get_paper("1"), paper(1, "word " * 100))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import os
+import tempfile
+import unittest
+
+from paper_storage import ID_FILES, JsonStorage, SqliteStorage
+from topic_pages import TopicPages, parse_topic_uri
+
+
+def paper(i: int) -> dict:
+    return {
+        "title": f"Paper {i}",
+        "authors": ["An Author"],
+        "summary": "A summary",
+        "pdf_url": f"http://arxiv.org/pdf/{i}",
+        "published": "2024-01-01",
+    }
+
+
+class TopicPagesTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.storage = SqliteStorage(os.path.join(self.dir, "papers.db"))
+        self.storage.add_papers("topic", {str(i): paper(i) for i in range(5)})
+        self.pages = TopicPages(self.storage, page_size=2)
+
+    def test_pages_split_the_topic(self):
+        first = self.pages.render("topic", "topic", 1)
+        last = self.pages.render("topic", "topic", 9)
+
+        self.assertIn("Total papers: 5", first)
+        self.assertIn("Page 1 of 3 (papers 1-2). Use @topic?page=2", first)
+        self.assertIn("Page 3 of 3 (papers 5-5).", last)
+        self.assertEqual(last.count("## Paper"), 1)
+        self.assertIsNone(self.pages.render("unknown", "unknown"))
+        self.assertEqual(parse_topic_uri("topic?page=x"), ("topic", 1))
+
+    def test_papers_without_a_record_are_not_counted(self):
+        storage = JsonStorage(os.path.join(self.dir, "papers"))
+        storage.add_papers("topic", {"1": paper(1)})
+        # An ID list entry whose record was never written
+        storage._merge("topic", ID_FILES, {"lost": None})
+        storage.add_papers("topic", {str(i): paper(i) for i in range(2, 5)})
+
+        page = TopicPages(storage, page_size=2).render("topic", "topic", 1)
+        self.assertIn("Total papers: 4", page)
+        self.assertIn("(papers 1-2)", page)
+        self.assertEqual(page.count("## Paper"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
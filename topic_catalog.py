@@ -0,0 +1,212 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from mcp.server.fastmcp import FastMCP
+from mcp.server.lowlevel import NotificationOptions
+
+from paper_storage import PaperStorage, get_storage
+
+
+# Seconds before the catalogue is rebuilt from storage to pick up writes made
+# by other processes; writes made through this process are applied directly
+CATALOG_REFRESH = float(os.getenv("TOPIC_CATALOG_REFRESH", "300"))
+FOLDERS_URI = "papers://folders"
+
+
+class TopicCatalog:
+    """
+    In-memory list of stored topics with their paper counts and update times.
+
+    The catalogue is loaded from storage on first use and then kept current
+    by `record_write`, so papers://folders is served without listing or
+    reading the paper directory. The rendered markdown is cached until the
+    catalogue changes.
+    """
+
+    def __init__(self, storage: PaperStorage, refresh_seconds: float = CATALOG_REFRESH):
+        self.storage = storage
+        self.refresh_seconds = refresh_seconds
+        self._topics = None
+        self._loaded_at = 0.0
+        self._rendered = None
+        self._lock = threading.Lock()
+
+    def _ensure_loaded(self) -> None:
+        if self._topics is None or time.monotonic() - self._loaded_at > self.refresh_seconds:
+            self._topics = self.storage.topic_stats()
+            self._loaded_at = time.monotonic()
+            self._rendered = None
+
+    def topics(self) -> Dict[str, Dict]:
+        """Return {"papers": count, "updated": timestamp} keyed by topic."""
+        with self._lock:
+            self._ensure_loaded()
+            return dict(self._topics)
+
+    def record_write(self, topic_dir: str) -> bool:
+        """
+        Refresh the entry of a topic that was just written.
+
+        Returns:
+            True if the topic was not in the catalogue before, or if the
+            catalogue had not been loaded yet and so cannot tell
+        """
+        with self._lock:
+            if self._topics is None:
+                # Loading it later reads the write from storage anyway
+                return True
+        stats = self.storage.topic_stats([topic_dir])
+        with self._lock:
+            previous = self._topics
+            self._ensure_loaded()
+            is_new = previous is None or topic_dir not in previous
+            if topic_dir in stats:
+                self._topics[topic_dir] = stats[topic_dir]
+            self._rendered = None
+        return is_new
+
+    def render(self) -> str:
+        """Render the catalogue as the markdown of the papers://folders resource."""
+        with self._lock:
+            self._ensure_loaded()
+            if self._rendered is None:
+                lines = ["# Available Topics\n\n"]
+                if self._topics:
+                    for folder in sorted(self._topics):
+                        info = self._topics[folder]
+                        updated = datetime.fromtimestamp(info["updated"]).strftime("%Y-%m-%d %H:%M")
+                        lines.append(f"- {folder} ({info['papers']} papers, updated {updated})\n")
+                    lines.append(f"\nUse @{folder} to access papers in that topic.\n")
+                else:
+                    lines.append("No topics found.\n")
+                self._rendered = "".join(lines)
+            return self._rendered
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_topic_catalog(paper_dir: str) -> TopicCatalog:
+    """Return the process-wide topic catalogue for the storage of `paper_dir`."""
+    with _catalogs_lock:
+        if paper_dir not in _catalogs:
+            _catalogs[paper_dir] = TopicCatalog(get_storage(paper_dir))
+        return _catalogs[paper_dir]
+
+
+class ResourceSubscriptions:
+    """
+    Tracks which client sessions subscribed to which resource URIs.
+
+    Notifications can be requested from any thread; they are sent on the
+    event loop the subscriptions were made on. Sessions that fail to receive
+    a notification are dropped.
+    """
+
+    def __init__(self):
+        self._subscribers = {}
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def subscribe(self, uri: str, session) -> None:
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._subscribers.setdefault(uri, set()).add(session)
+
+    def unsubscribe(self, uri: str, session) -> None:
+        with self._lock:
+            sessions = self._subscribers.get(uri)
+            if sessions is not None:
+                sessions.discard(session)
+                if not sessions:
+                    del self._subscribers[uri]
+
+    def _drop(self, session) -> None:
+        with self._lock:
+            for uri in list(self._subscribers):
+                self._subscribers[uri].discard(session)
+                if not self._subscribers[uri]:
+                    del self._subscribers[uri]
+
+    async def _send(self, uris: Iterable[str], list_changed: bool) -> None:
+        with self._lock:
+            targets = [
+                (uri, session) for uri in uris for session in self._subscribers.get(uri, ())
+            ]
+            everyone = set().union(*self._subscribers.values()) if list_changed else set()
+
+        for uri, session in targets:
+            try:
+                await session.send_resource_updated(uri)
+            except Exception:
+                self._drop(session)
+        for session in everyone:
+            try:
+                await session.send_resource_list_changed()
+            except Exception:
+                self._drop(session)
+
+    def notify(self, uris: Iterable[str], list_changed: bool = False) -> None:
+        """
+        Send resource-updated notifications for `uris` to their subscribers.
+
+        Args:
+            uris: URIs whose content changed
+            list_changed: Also tell every subscribed session that the list of
+                resources changed
+        """
+        with self._lock:
+            loop = self._loop
+            if loop is None or loop.is_closed():
+                return
+        uris = list(uris)
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            loop.create_task(self._send(uris, list_changed))
+        else:
+            asyncio.run_coroutine_threadsafe(self._send(uris, list_changed), loop)
+
+    def enable(self, mcp: FastMCP) -> None:
+        """Handle resource (un)subscribe requests and advertise both notification kinds."""
+        server = mcp._mcp_server
+
+        @server.subscribe_resource()
+        async def subscribe(uri) -> None:
+            self.subscribe(str(uri), server.request_context.session)
+
+        @server.unsubscribe_resource()
+        async def unsubscribe(uri) -> None:
+            self.unsubscribe(str(uri), server.request_context.session)
+
+        # The low-level server always reports subscribe=False and only sets
+        # listChanged when asked, so patch the options FastMCP hands it
+        create_options = server.create_initialization_options
+
+        def create_initialization_options(
+            notification_options: Optional[NotificationOptions] = None,
+            experimental_capabilities: Optional[Dict] = None,
+        ):
+            notification_options = notification_options or NotificationOptions()
+            notification_options.resources_changed = True
+            options = create_options(notification_options, experimental_capabilities)
+            options.capabilities.resources.subscribe = True
+            return options
+
+        server.create_initialization_options = create_initialization_options
+
+
+subscriptions = ResourceSubscriptions()
+
+
+def record_topic_write(paper_dir: str, topic_dir: str) -> None:
+    """Update the catalogue after papers were stored and notify subscribed clients."""
+    is_new = get_topic_catalog(paper_dir).record_write(topic_dir)
+    subscriptions.notify([f"papers://{topic_dir}", FOLDERS_URI], list_changed=is_new)
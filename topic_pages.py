@@ -0,0 +1,148 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from paper_storage import PaperStorage, get_storage
+
+
+# Number of papers shown on one page of a papers://{topic} resource
+PAGE_SIZE = int(os.getenv("TOPIC_PAGE_SIZE", "50"))
+# Number of topics whose rendered papers are kept in memory
+CACHED_TOPICS = int(os.getenv("TOPIC_CACHE_SIZE", "64"))
+
+
+def parse_topic_uri(topic: str) -> Tuple[str, int]:
+    """
+    Split the `{topic}` part of a papers:// URI into the topic and page number.
+
+    `llm_reasoning?page=3` gives ("llm_reasoning", 3). The page defaults to 1.
+    """
+    topic, _, query = topic.partition("?")
+    try:
+        page = int(parse_qs(query).get("page", ["1"])[0])
+    except ValueError:
+        page = 1
+    return topic, max(page, 1)
+
+
+def render_paper(paper_id: str, paper_info: Dict) -> str:
+    """Render one paper as the markdown section used by the topic resource."""
+    return (
+        f"## {paper_info['title']}\n"
+        f"- **Paper ID**: {paper_id}\n"
+        f"- **Authors**: {', '.join(paper_info['authors'])}\n"
+        f"- **Published**: {paper_info['published']}\n"
+        f"- **PDF URL**: [{paper_info['pdf_url']}]({paper_info['pdf_url']})\n\n"
+        f"### Summary\n{paper_info['summary'][:500]}...\n\n"
+        "---\n\n"
+    )
+
+
+class TopicPages:
+    """
+    Renders papers://{topic} resources from memoised per-paper sections.
+
+    A topic's paper IDs and the sections rendered so far are kept until the
+    storage reports a new version for it (a new file mtime, log size or
+    database version), so repeated reads skip both parsing and rendering.
+    Large topics are split into pages of `page_size` papers, and only the
+    papers on a requested page are read in full and rendered.
+    """
+
+    def __init__(
+        self,
+        storage: PaperStorage,
+        page_size: int = PAGE_SIZE,
+        max_topics: int = CACHED_TOPICS,
+    ):
+        self.storage = storage
+        self.page_size = page_size
+        self.max_topics = max_topics
+        self._sections = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _topic(self, topic_dir: str) -> Optional[Tuple[List[str], Dict[str, str]]]:
+        """Return a topic's paper IDs and its sections rendered so far, or None if it is unknown."""
+        version = self.storage.topic_version(topic_dir)
+        if version is None:
+            return None
+
+        with self._lock:
+            entry = self._sections.get(topic_dir)
+            if entry is not None and entry[0] == version:
+                self._sections.move_to_end(topic_dir)
+                return entry[1], entry[2]
+
+        paper_ids = self.storage.topic_paper_ids(topic_dir)
+        if paper_ids is None:
+            return None
+        # Leave out IDs without a stored record, so the total and the pages
+        # count only papers that are listed
+        titles = self.storage.get_papers(paper_ids, fields=["title"])
+        paper_ids = [paper_id for paper_id in paper_ids if titles[paper_id] is not None]
+        rendered = {}
+
+        with self._lock:
+            self._sections[topic_dir] = (version, paper_ids, rendered)
+            self._sections.move_to_end(topic_dir)
+            while len(self._sections) > self.max_topics:
+                self._sections.popitem(last=False)
+        return paper_ids, rendered
+
+    def _render_sections(self, paper_ids: List[str], rendered: Dict[str, str]) -> List[str]:
+        missing = [paper_id for paper_id in paper_ids if paper_id not in rendered]
+        if missing:
+            papers = self.storage.get_papers(missing)
+            for paper_id in missing:
+                if papers[paper_id] is not None:
+                    rendered[paper_id] = render_paper(paper_id, papers[paper_id])
+        return [rendered[paper_id] for paper_id in paper_ids if paper_id in rendered]
+
+    def render(self, topic: str, topic_dir: str, page: int = 1) -> Optional[str]:
+        """
+        Render one page of a topic's papers as markdown.
+
+        Args:
+            topic: The topic as requested, used for the heading
+            topic_dir: Name of the topic folder
+            page: 1-based page number
+
+        Returns:
+            The markdown page, or None if the topic has no stored papers
+        """
+        cached = self._topic(topic_dir)
+        if cached is None:
+            return None
+        paper_ids, rendered = cached
+
+        total = len(paper_ids)
+        pages = max((total + self.page_size - 1) // self.page_size, 1)
+        page = min(page, pages)
+        start = (page - 1) * self.page_size
+        end = min(start + self.page_size, total)
+
+        parts = [
+            f"# Papers on {topic.replace('_', ' ').title()}\n\n",
+            f"Total papers: {total}\n\n",
+        ]
+        if pages > 1:
+            parts.append(f"Page {page} of {pages} (papers {start + 1}-{end}).")
+            if page < pages:
+                parts.append(f" Use @{topic}?page={page + 1} for the next page.")
+            parts.append("\n\n")
+        parts.extend(self._render_sections(paper_ids[start:end], rendered))
+        return "".join(parts)
+
+
+_pages = {}
+_pages_lock = threading.Lock()
+
+
+def get_topic_pages(paper_dir: str) -> TopicPages:
+    """Return the process-wide topic renderer for the storage of `paper_dir`."""
+    with _pages_lock:
+        if paper_dir not in _pages:
+            _pages[paper_dir] = TopicPages(get_storage(paper_dir))
+        return _pages[paper_dir]
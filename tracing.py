@@ -0,0 +1,242 @@
+import contextlib
+import contextvars
+import json
+import os
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+
+# Export formats: "memory" only keeps spans for /stats, "json" also appends
+# each finished trace to a file as one JSON line, and "otlp" appends it in
+# the OpenTelemetry OTLP/JSON format used by the collector's file receiver
+TRACE_FORMATS = ("memory", "json", "otlp")
+TRACE_PATH = "mcp_trace.jsonl"
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation, with its parent and key/value attributes."""
+
+    def __init__(self, name: str, kind: str, trace_id: str, parent_id: Optional[str], attributes: Dict):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def seconds(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "seconds": self.seconds,
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+    def to_otlp(self) -> Dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            # SPAN_KIND_INTERNAL for the turn, SPAN_KIND_CLIENT for calls out
+            "kind": 1 if self.parent_id is None else 3,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [
+                {"key": key, "value": _otlp_value(value)}
+                for key, value in {"mcp.span_kind": self.kind, **self.attributes}.items()
+            ],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class _NoopSpan:
+    def set(self, **attributes) -> None:
+        pass
+
+
+class Tracer:
+    """
+    Records spans for chatbot turns, LLM calls, tool calls, resource reads
+    and server starts.
+
+    A span started inside another one (in the same task, or in a task
+    created inside it) becomes its child; spans started outside any span
+    are the roots of their own trace. When a root span ends, its trace is
+    kept for `turn_stats` and, depending on `export`, appended to `path`.
+    With `export` None, spans are not recorded at all.
+    """
+
+    def __init__(self, export: Optional[str] = None, path: str = TRACE_PATH, max_traces: int = 100):
+        if export is not None and export not in TRACE_FORMATS:
+            raise ValueError(f"Unknown trace format: {export}")
+        self.export = export
+        self.path = path
+        # trace_id -> finished spans, for traces whose root has not ended yet
+        self._open = {}
+        self.traces = deque(maxlen=max_traces)
+
+    @property
+    def enabled(self) -> bool:
+        return self.export is not None
+
+    @contextlib.contextmanager
+    def span(self, name: str, kind: str, current: bool = True, **attributes):
+        """
+        Time the block as a span and yield it, so attributes can be added.
+
+        With `current` False, spans started inside the block do not become
+        its children, e.g. tool calls that run while an LLM response streams.
+        """
+        if not self.enabled:
+            yield _NoopSpan()
+            return
+
+        parent = _current_span.get()
+        span = Span(
+            name,
+            kind,
+            parent.trace_id if parent else os.urandom(16).hex(),
+            parent.span_id if parent else None,
+            attributes,
+        )
+        if parent is None:
+            self._open[span.trace_id] = []
+        token = _current_span.set(span) if current else None
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end_ns = time.time_ns()
+            if token is not None:
+                _current_span.reset(token)
+            self._finish(span)
+
+    def _finish(self, span: Span) -> None:
+        spans = self._open.get(span.trace_id)
+        if spans is None:
+            # A child that outlived its trace, e.g. a server start after a timeout
+            return
+        spans.append(span)
+        if span.parent_id is not None:
+            return
+        del self._open[span.trace_id]
+        self.traces.append(spans)
+        if self.export == "json":
+            self._write({"trace_id": span.trace_id, "spans": [s.to_dict() for s in spans]})
+        elif self.export == "otlp":
+            self._write({
+                "resourceSpans": [{
+                    "resource": {"attributes": [
+                        {"key": "service.name", "value": {"stringValue": "mcp-chatbot"}}
+                    ]},
+                    "scopeSpans": [{
+                        "scope": {"name": "mcp_chatbot"},
+                        "spans": [s.to_otlp() for s in spans],
+                    }],
+                }]
+            })
+
+    def _write(self, record: Dict) -> None:
+        try:
+            with open(self.path, "a") as file:
+                file.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            print(f"Error writing trace: {e}")
+
+    def turn_stats(self, count: int = 1) -> List[Dict]:
+        """Summarise the latest `count` turns: where their time and tokens went."""
+        turns = [spans for spans in self.traces if spans[-1].kind == "turn"][-count:]
+        stats = []
+        for spans in turns:
+            root = spans[-1]
+            summary = {
+                "query": root.attributes.get("query", ""),
+                "seconds": root.seconds,
+                "error": root.error,
+                "llm_calls": 0,
+                "llm_seconds": 0.0,
+                "input_tokens": 0,
+                "output_tokens": 0,
+                "cache_read_tokens": 0,
+                # (kind, server, name) -> [calls, seconds, bytes, errors]
+                "calls": {},
+            }
+            for span in spans[:-1]:
+                if span.kind == "llm":
+                    summary["llm_calls"] += 1
+                    summary["llm_seconds"] += span.seconds
+                    summary["input_tokens"] += span.attributes.get("input_tokens", 0)
+                    summary["output_tokens"] += span.attributes.get("output_tokens", 0)
+                    summary["cache_read_tokens"] += span.attributes.get("cache_read_input_tokens", 0)
+                    continue
+                key = (span.kind, span.attributes.get("server", "-"), span.name)
+                entry = summary["calls"].setdefault(key, [0, 0.0, 0, 0])
+                entry[0] += 1
+                entry[1] += span.seconds
+                entry[2] += span.attributes.get("result_bytes", 0)
+                entry[3] += span.error is not None or bool(span.attributes.get("is_error"))
+            stats.append(summary)
+        return stats
+
+    def print_stats(self, count: int = 1) -> None:
+        if not self.enabled:
+            print("Tracing is off. Set MCP_TRACE=memory, json or otlp to record turns.")
+            return
+        stats = self.turn_stats(count)
+        if not stats:
+            print("No traced turns yet.")
+            return
+        for summary in stats:
+            query = summary["query"]
+            print(f"\nTurn: {query[:60]}{'...' if len(query) > 60 else ''}")
+            print(f"  {'total':<13}{summary['seconds']:.2f}s" + (f" (failed: {summary['error']})" if summary["error"] else ""))
+            print(
+                f"  {'llm':<13}{summary['llm_seconds']:.2f}s in {summary['llm_calls']} call(s), "
+                f"{summary['input_tokens']} input / {summary['output_tokens']} output tokens, "
+                f"{summary['cache_read_tokens']} read from cache"
+            )
+            # Tool calls run in parallel with each other and with streaming,
+            # so these times can add up to more than the turn took
+            for (kind, server, name), (calls, seconds, size, errors) in sorted(
+                summary["calls"].items(), key=lambda item: -item[1][1]
+            ):
+                line = f"  {kind:<13}{seconds:.2f}s  {server}/{name} x{calls}"
+                if size:
+                    line += f", {size} bytes"
+                if errors:
+                    line += f", {errors} failed"
+                print(line)
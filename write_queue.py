@@ -0,0 +1,173 @@
+import atexit
+import functools
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict
+
+from metrics import metrics
+from paper_storage import PaperStorage, get_storage
+from topic_catalog import record_topic_write
+
+
+# Seconds the writer waits after the first pending write, so concurrent
+# writes to the same topic are merged into one flush
+FLUSH_INTERVAL = float(os.getenv("WRITE_FLUSH_INTERVAL", "0.05"))
+# "flushed": confirm a write once storage has it (the storage fsyncs)
+# "accepted": confirm as soon as it is queued; a crash can lose one interval
+DURABILITY = os.getenv("WRITE_DURABILITY", "flushed").lower()
+DURABILITY_LEVELS = ("flushed", "accepted")
+
+
+class WriteQueue:
+    """
+    Funnels every paper write of a process through one writer thread.
+
+    `submit` queues papers for a topic and returns a future. The writer
+    waits `flush_interval` after the first pending write, then merges
+    everything queued per topic and stores each topic with a single
+    `add_papers` call, so N concurrent writes to a topic cost one storage
+    write. Later writes of the same paper override earlier ones.
+
+    With durability "flushed" the future resolves to the storage location
+    after the flush; with "accepted" it resolves immediately, and the
+    queue is drained at interpreter exit. Either way, listeners added with
+    `add_listener` run once the papers are in storage.
+    """
+
+    def __init__(
+        self,
+        storage: PaperStorage,
+        flush_interval: float = FLUSH_INTERVAL,
+        durability: str = DURABILITY,
+    ):
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Unknown WRITE_DURABILITY: {durability}")
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.durability = durability
+        # topic_dir -> (merged papers, futures waiting on the flush)
+        self._pending = {}
+        self._flushing = False
+        self._cond = threading.Condition()
+        self._writer = None
+        self._listeners = []
+        # Submitted writes and topic flushes, reported by /metrics
+        self.flushes = 0
+        self.writes = 0
+
+    def _ensure_writer(self) -> None:
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._run, name="paper-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.flush)
+
+    def add_listener(self, listener: Callable[[str], None]) -> None:
+        """Call `listener(topic_dir)` from the writer thread after each flush of a topic."""
+        self._listeners.append(listener)
+
+    def submit(self, topic_dir: str, papers: Dict[str, Dict]) -> Future:
+        """
+        Queue papers to be stored under `topic_dir`.
+
+        Returns:
+            A future resolving to the location returned by the storage, or
+            raising the storage error
+        """
+        future = Future()
+        with self._cond:
+            self._ensure_writer()
+            merged, futures = self._pending.setdefault(topic_dir, ({}, []))
+            merged.update(papers)
+            self.writes += 1
+            if self.durability == "accepted":
+                future.set_result(f"queued for {topic_dir}")
+            else:
+                futures.append(future)
+            self._cond.notify_all()
+        return future
+
+    def add_papers(self, topic_dir: str, papers: Dict[str, Dict]) -> str:
+        """Queue papers and block until the write is confirmed."""
+        return self.submit(topic_dir, papers).result()
+
+    def flush(self) -> None:
+        """Block until every write queued so far has reached storage."""
+        with self._cond:
+            while self._pending or self._flushing:
+                self._cond.wait()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+            # Let writes arriving in the next interval join this batch
+            time.sleep(self.flush_interval)
+            with self._cond:
+                batch, self._pending = self._pending, {}
+                self._flushing = True
+
+            for topic_dir, (papers, futures) in batch.items():
+                try:
+                    with metrics.track("stage", "storage_write"):
+                        location = self.storage.add_papers(topic_dir, papers)
+                except Exception as e:
+                    if not futures:
+                        print(f"Error storing papers for {topic_dir}: {str(e)}", file=sys.stderr)
+                    for future in futures:
+                        future.set_exception(e)
+                    continue
+                # Before the futures resolve, so a confirmed write is already listed
+                for listener in self._listeners:
+                    try:
+                        listener(topic_dir)
+                    except Exception as e:
+                        print(f"Error after storing papers for {topic_dir}: {str(e)}", file=sys.stderr)
+                for future in futures:
+                    future.set_result(location)
+
+            with self._cond:
+                self.flushes += len(batch)
+                self._flushing = False
+                self._cond.notify_all()
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_write_queue(paper_dir: str) -> WriteQueue:
+    """Return the process-wide write queue for the storage of `paper_dir`."""
+    with _queues_lock:
+        if paper_dir not in _queues:
+            queue = WriteQueue(get_storage(paper_dir))
+            # Keep the topic catalogue current and notify subscribed clients
+            # once papers are stored, not when they are only queued
+            queue.add_listener(functools.partial(record_topic_write, paper_dir))
+            _queues[paper_dir] = queue
+        return _queues[paper_dir]
+
+
+def _queue_totals() -> Dict[str, float]:
+    with _queues_lock:
+        queues = list(_queues.values())
+    writes = sum(queue.writes for queue in queues)
+    flushes = sum(queue.flushes for queue in queues)
+    return {"writes": writes, "flushes": flushes, "writes_per_flush": writes / max(flushes, 1)}
+
+
+metrics.register_callback(
+    "research_write_queue_writes_total", "Paper writes submitted to the write queue.", "counter",
+    lambda: _queue_totals()["writes"],
+)
+metrics.register_callback(
+    "research_write_queue_flushes_total", "Topic writes the write queue made to storage.", "counter",
+    lambda: _queue_totals()["flushes"],
+)
+metrics.register_callback(
+    "research_write_queue_writes_per_flush", "Submitted writes merged into each storage write.", "gauge",
+    lambda: _queue_totals()["writes_per_flush"],
+)